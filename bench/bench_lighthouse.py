@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+
+# Offline benchmarks for LightHouse: how long does a switch take, and did a change make it slower?
+#
+# Every scenario runs in its own process, against:
+#   - a private session bus ('dbus-daemon --session'), never the desktop's one;
+#   - stub org.kde.plasmashell, org.kde.GtkConfig, org.freedesktop.Notifications and org.kde.konsole-<pid>
+#     services (see stub_services.py) with configurable latencies, window and session counts;
+#   - a fake 'lookandfeeltool' executable put first in PATH;
+#   - a temporary home holding kdeglobals, konsolerc, settings.json, Konsole profiles and wallpapers.
+#
+# Results are printed as a table and written as JSON; measures slower than bench/thresholds.json make
+# the benchmark exit with status 1.
+#
+# Usage:
+#   bench_lighthouse.py [-s SCENARIO] [-n ITERATIONS] [-o OUTPUT_JSON] [-t THRESHOLDS_JSON]
+#
+# Requires dbus-python, PyGObject and dbus-daemon.
+
+import os
+import sys
+import json
+import time
+import getopt
+import shutil
+import tempfile
+import statistics
+import subprocess
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(os.path.dirname(bench_dir), "src")
+
+# Latencies are in seconds
+SCENARIOS = {
+    "realistic": {
+        "konsole_instances": 3,
+        "konsole_sessions": 3,
+        "konsole_windows": 2,
+        "settings_size": 50_000,
+        "desktops": 2,
+        "plasmashell_latency": 0.05,
+        "desktop_latency": 0.01,
+        "gtk_latency": 0.02,
+        "konsole_latency": 0.005,
+        "lookandfeeltool_latency": 0.5,
+    },
+    "large": {
+        "konsole_instances": 10,
+        "konsole_sessions": 5,
+        "konsole_windows": 3,
+        "settings_size": 4_000_000,
+        "desktops": 12,
+        "plasmashell_latency": 0.05,
+        "desktop_latency": 0.01,
+        "gtk_latency": 0.02,
+        "konsole_latency": 0.005,
+        "lookandfeeltool_latency": 0.5,
+    },
+}
+
+# The two themes the benchmarks switch between, so that every switch has something to do
+THEMES = [
+    {
+        "plasma_theme": "Bench-Light",
+        "gtk_theme": "Bench-Light-GTK",
+        "wallpaper": "light.jpg",
+        "konsole_profile": "Bench-Light",
+        "vscode_theme": "Bench Light",
+    },
+    {
+        "plasma_theme": "Bench-Dark",
+        "gtk_theme": "Bench-Dark-GTK",
+        "wallpaper": "dark.jpg",
+        "konsole_profile": "Bench-Dark",
+        "vscode_theme": "Bench Dark",
+    },
+]
+
+
+def write_file(path: str, content: str, executable: bool = False) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+    if executable:
+        os.chmod(path, 0o755)
+
+def make_home(root: str, scenario: dict) -> dict:
+    """Creates the temporary home and the fake tools of a scenario.
+
+    Args:
+        root (str): The temporary directory.
+        scenario (dict): The scenario, see SCENARIOS.
+
+    Returns:
+        dict: The paths LightHouse must use: config_path, localPath, vscode_path, cache_path, bin and wallpapers.
+    """
+    home = os.path.join(root, "home")
+    paths = {
+        "config_path": os.path.join(home, ".config/"),
+        "localPath": os.path.join(home, ".local/"),
+        "vscode_path": os.path.join(home, ".config/Code/User/"),
+        "cache_path": os.path.join(home, ".cache/lighthouse/"),
+        "bin": os.path.join(root, "bin"),
+        "wallpapers": os.path.join(home, "Pictures/"),
+    }
+
+    write_file(paths["config_path"] + "kdeglobals", "[General]\nColorScheme=BreezeLight\n\n[KDE]\nLookAndFeelPackage=Bench-Light\nSingleClick=false\n")
+    write_file(paths["config_path"] + "konsolerc", "[Desktop Entry]\nDefaultProfile=Bench-Light.profile\n\n[MainWindow]\nToolBarsMovable=Disabled\n")
+    # Written by kded and plasmashell on a real desktop, never by the stubs: they only have to exist, as the
+    # state cache treats a missing file as a component to apply (and switch_theme_noop would call them)
+    write_file(paths["config_path"] + "gtk-3.0/settings.ini", "[Settings]\ngtk-theme-name=Bench-Light-GTK\n")
+    write_file(paths["config_path"] + "plasma-org.kde.plasma.desktop-appletsrc", "[Containments][1]\nwallpaperplugin=org.kde.image\n")
+    for theme in THEMES:
+        package = paths["localPath"] + f"share/plasma/look-and-feel/{theme['plasma_theme']}/"
+        write_file(package + "metadata.json", json.dumps({"KPlugin": {"Id": theme["plasma_theme"], "Name": theme["plasma_theme"]}}))
+        write_file(paths["localPath"] + f"share/konsole/{theme['konsole_profile']}.profile", f"[General]\nName={theme['konsole_profile']}\n")
+        write_file(paths["wallpapers"] + theme["wallpaper"], "not really a JPEG\n")
+
+    # A settings.json of the requested size: filler keys, comments, then the keys LightHouse changes
+    lines = ["// Benchmark settings", "{"]
+    size = 0
+    index = 0
+    while size < scenario["settings_size"]:
+        line = f'    "bench.filler.{index}": "{"x" * 64}", // filler'
+        lines.append(line)
+        size += len(line) + 1
+        index += 1
+    lines += ['    "workbench.colorTheme": "Bench Light",', '    "latex-workshop.view.pdf.invert": 0', "}"]
+    write_file(paths["vscode_path"] + "settings.json", "\n".join(lines) + "\n")
+
+    write_file(paths["bin"] + "/lookandfeeltool", f"""#!/bin/sh
+if [ "$1" = "-l" ]; then
+    echo {THEMES[0]['plasma_theme']}
+    echo {THEMES[1]['plasma_theme']}
+else
+    sleep {scenario['lookandfeeltool_latency']}
+fi
+""", executable=True)
+    return paths
+
+def stats(samples: list) -> dict:
+    """Summarizes the samples (seconds) in milliseconds."""
+    ordered = sorted(samples)
+    return {
+        "min": ordered[0] * 1000,
+        "median": statistics.median(ordered) * 1000,
+        "p90": ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))] * 1000,
+        "max": ordered[-1] * 1000,
+        "iterations": len(ordered),
+    }
+
+def measure(function, iterations: int) -> dict:
+    """Times the function, called with the index of the iteration."""
+    samples = []
+    for iteration in range(iterations):
+        start = time.perf_counter()
+        function(iteration)
+        samples.append(time.perf_counter() - start)
+    return stats(samples)
+
+def run_scenario(name: str, iterations: int) -> dict:
+    """Runs a scenario in the current process (see --run-scenario).
+
+    Args:
+        name (str): The name of the scenario, see SCENARIOS.
+        iterations (int): How many times each measure is repeated.
+
+    Returns:
+        dict: Maps each measure to its statistics, see stats().
+    """
+    scenario = SCENARIOS[name]
+    root = tempfile.mkdtemp(prefix="lighthouse-bench-")
+    processes = []
+    try:
+        paths = make_home(root, scenario)
+
+        bus_daemon = subprocess.Popen(["dbus-daemon", "--session", "--nofork", "--print-address=1"], stdout=subprocess.PIPE, text=True)
+        processes.append(bus_daemon)
+        os.environ["DBUS_SESSION_BUS_ADDRESS"] = bus_daemon.stdout.readline().strip()
+        os.environ["PATH"] = paths["bin"] + os.pathsep + os.environ["PATH"]
+        # Look-and-feel packages are looked up in the temporary home only
+        os.environ["XDG_DATA_DIRS"] = os.path.join(root, "share")
+
+        stubs = subprocess.Popen([sys.executable, os.path.join(bench_dir, "stub_services.py"), json.dumps(scenario)], stdout=subprocess.PIPE, text=True)
+        processes.append(stubs)
+        if stubs.stdout.readline().strip() != "ready":
+            raise RuntimeError("The stub services did not start")
+
+        sys.path.insert(0, src_dir)
+        import LightHouse
+        LightHouse.setup_logging(verbose=False)
+        for variable in ("config_path", "localPath", "vscode_path", "cache_path"):
+            setattr(LightHouse, variable, paths[variable])
+        LightHouse.settings_file = paths["config_path"] + "lighthouse/config.json"
+        themes = [dict(theme, wallpaper=paths["wallpapers"] + theme["wallpaper"]) for theme in THEMES]
+
+        def forget_state():
+            # Start from a cold state cache: every component has something to do
+            LightHouse._state_cache = None
+            if os.path.exists(paths["cache_path"] + "state.json"):
+                os.unlink(paths["cache_path"] + "state.json")
+
+        results = {
+            "set_plasma_global_theme": measure(lambda i: LightHouse.set_plasma_global_theme(themes[i % 2]["plasma_theme"]), iterations),
+            "set_gtk_theme": measure(lambda i: LightHouse.set_gtk_theme(themes[i % 2]["gtk_theme"]), iterations),
+            "set_wallpaper": measure(lambda i: LightHouse.set_wallpaper(themes[i % 2]["wallpaper"]), iterations),
+            "set_konsole": measure(lambda i: LightHouse.set_konsole(themes[i % 2]["konsole_profile"]), iterations),
+            "set_vscode": measure(lambda i: LightHouse.set_vscode(themes[i % 2]["vscode_theme"]), iterations),
+            "check_args": measure(lambda i: LightHouse.check_args(
+                {argument: themes[i % 2][argument] for argument in ("plasma_theme", "gtk_theme", "wallpaper", "konsole_profile")}
+            ), iterations),
+            "switch_theme": measure(lambda i: (forget_state(), LightHouse.switch_theme(**themes[i % 2])), iterations),
+        }
+        # A run with nothing to do: the theme just applied is requested again
+        LightHouse.switch_theme(**themes[0])
+        results["switch_theme_noop"] = measure(lambda i: LightHouse.switch_theme(**themes[0]), iterations)
+        return results
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            process.wait()
+        shutil.rmtree(root, ignore_errors=True)
+
+def check_thresholds(
+        results: dict,
+        thresholds: dict,
+    ) -> list:
+    """Compares the median of every measure with its threshold.
+
+    Args:
+        results (dict): Maps each scenario to its measures.
+        thresholds (dict): Maps each scenario to {measure: maximum median, in ms}.
+
+    Returns:
+        list: The regressions, as human readable strings.
+    """
+    regressions = []
+    for scenario, measures in results.items():
+        for measure_name, limit in thresholds.get(scenario, {}).items():
+            if measure_name in measures and measures[measure_name]["median"] > limit:
+                regressions.append(f"{scenario}/{measure_name}: {measures[measure_name]['median']:.1f} ms > {limit} ms")
+    return regressions
+
+
+if __name__ == '__main__':
+    short_opts : str = "hs:n:o:t:"
+    long_opts : list = ["help", "scenario=", "iterations=", "output=", "thresholds=", "run-scenario="]
+    try:
+        args, vals = getopt.getopt(sys.argv[1:], short_opts, long_opts)
+    except getopt.error as e:
+        print(e, file=sys.stderr)
+        sys.exit(2)
+
+    scenarios = list(SCENARIOS)
+    iterations = 10
+    output = None
+    thresholds_file = os.path.join(bench_dir, "thresholds.json")
+    for curr_arg, curr_val in args:
+        if curr_arg in ("-h", "--help"):
+            print(f"Usage: {sys.argv[0]} [-s SCENARIO] [-n ITERATIONS] [-o OUTPUT_JSON] [-t THRESHOLDS_JSON]")
+            print(f"Scenarios: {', '.join(SCENARIOS)}")
+            sys.exit()
+        elif curr_arg in ("-s", "--scenario"):
+            scenarios = [curr_val]
+        elif curr_arg in ("-n", "--iterations"):
+            iterations = int(curr_val)
+        elif curr_arg in ("-o", "--output"):
+            output = curr_val
+        elif curr_arg in ("-t", "--thresholds"):
+            thresholds_file = curr_val
+        elif curr_arg == "--run-scenario":
+            # Internal: run a single scenario in this process, print its results as JSON
+            print(json.dumps(run_scenario(curr_val, iterations)))
+            sys.exit()
+
+    results = {}
+    for scenario in scenarios:
+        # A process per scenario: each one needs its own session bus connection
+        res = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "-n", str(iterations), "--run-scenario", scenario],
+            stdout=subprocess.PIPE, text=True, check=True,
+        )
+        results[scenario] = json.loads(res.stdout.splitlines()[-1])
+
+    with open(thresholds_file, "r") as f:
+        regressions = check_thresholds(results, json.load(f))
+
+    for scenario, measures in results.items():
+        print(f"--- {scenario} ---")
+        print(f"\t{'measure':<28}{'min':>10}{'median':>10}{'p90':>10}{'max':>10}")
+        for measure_name, values in measures.items():
+            print(f"\t{measure_name:<28}{values['min']:>10.1f}{values['median']:>10.1f}{values['p90']:>10.1f}{values['max']:>10.1f}")
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+
+    report = {"results": results, "regressions": regressions}
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=4)
+    sys.exit(1 if regressions else 0)
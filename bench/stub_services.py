@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+# Stub KDE services for the LightHouse benchmarks, started by bench_lighthouse.py on a private session bus.
+# Each method replies after a configurable latency, without blocking the others (like separate processes would).
+#
+# Usage: stub_services.py SCENARIO_JSON
+#
+# Requires dbus-python and PyGObject (for the GLib main loop).
+
+import sys
+import json
+
+import dbus
+import dbus.service
+from gi.repository import GLib
+from dbus.mainloop.glib import DBusGMainLoop
+
+
+def reply_later(latency: float, reply, *values) -> None:
+    """Sends the reply of an asynchronous method after the given latency (seconds)."""
+    def send():
+        reply(*values)
+        return False
+    GLib.timeout_add(int(latency * 1000), send)
+
+
+class PlasmaShell(dbus.service.Object):
+    def __init__(self, bus, scenario: dict) -> None:
+        super().__init__(bus, "/PlasmaShell")
+        self.scenario = scenario
+
+    @dbus.service.method("org.kde.PlasmaShell", in_signature="s", out_signature="s", async_callbacks=("reply", "error"))
+    def evaluateScript(self, script, reply, error):
+        # The wallpaper script loops over every desktop
+        reply_later(self.scenario["plasmashell_latency"] + self.scenario["desktop_latency"] * self.scenario["desktops"], reply, "")
+
+class GtkConfig(dbus.service.Object):
+    def __init__(self, bus, scenario: dict) -> None:
+        super().__init__(bus, "/GtkConfig")
+        self.scenario = scenario
+
+    @dbus.service.method("org.kde.GtkConfig", in_signature="s", out_signature="", async_callbacks=("reply", "error"))
+    def setGtkTheme(self, theme, reply, error):
+        reply_later(self.scenario["gtk_latency"], reply)
+
+class Notifications(dbus.service.Object):
+    def __init__(self, bus, scenario: dict) -> None:
+        super().__init__(bus, "/org/freedesktop/Notifications")
+        self.last_id = 0
+
+    @dbus.service.method("org.freedesktop.Notifications", in_signature="susssasa{sv}i", out_signature="u")
+    def Notify(self, app_name, replaces_id, app_icon, summary, body, actions, hints, expire_timeout):
+        self.last_id = replaces_id or self.last_id + 1
+        return self.last_id
+
+class KonsoleSessions(dbus.service.Object):
+    # Nothing but the parent node of the sessions: Introspect lists them as children
+    def __init__(self, bus) -> None:
+        super().__init__(bus, "/Sessions")
+
+class KonsoleSession(dbus.service.Object):
+    def __init__(self, bus, number: int, scenario: dict) -> None:
+        super().__init__(bus, f"/Sessions/{number}")
+        self.scenario = scenario
+
+    @dbus.service.method("org.kde.konsole.Session", in_signature="s", out_signature="", async_callbacks=("reply", "error"))
+    def setProfile(self, profile, reply, error):
+        reply_later(self.scenario["konsole_latency"], reply)
+
+class KonsoleWindows(dbus.service.Object):
+    # Nothing but the parent node of the windows: Introspect lists them as children
+    def __init__(self, bus) -> None:
+        super().__init__(bus, "/Windows")
+
+class KonsoleWindow(dbus.service.Object):
+    def __init__(self, bus, number: int, scenario: dict) -> None:
+        super().__init__(bus, f"/Windows/{number}")
+        self.scenario = scenario
+
+    @dbus.service.method("org.kde.konsole.Window", in_signature="s", out_signature="", async_callbacks=("reply", "error"))
+    def setDefaultProfile(self, profile, reply, error):
+        reply_later(self.scenario["konsole_latency"], reply)
+
+
+if __name__ == '__main__':
+    scenario = json.loads(sys.argv[1])
+
+    DBusGMainLoop(set_as_default=True)
+    bus = dbus.SessionBus()
+
+    # Keep references: a name is released as soon as its BusName is garbage collected
+    names = [
+        dbus.service.BusName("org.kde.plasmashell", bus),
+        dbus.service.BusName("org.kde.GtkConfig", bus),
+        dbus.service.BusName("org.freedesktop.Notifications", bus),
+    ]
+    # All the Konsole instances share the same objects, i.e. the same windows and sessions
+    names += [dbus.service.BusName(f"org.kde.konsole-{90000 + i}", bus) for i in range(scenario["konsole_instances"])]
+    objects = [PlasmaShell(bus, scenario), GtkConfig(bus, scenario), Notifications(bus, scenario), KonsoleSessions(bus), KonsoleWindows(bus)]
+    objects += [KonsoleSession(bus, number, scenario) for number in range(1, scenario["konsole_sessions"] + 1)]
+    objects += [KonsoleWindow(bus, number, scenario) for number in range(1, scenario["konsole_windows"] + 1)]
+
+    print("ready", flush=True)
+    GLib.MainLoop().run()
@@ -1,28 +1,26 @@
 #!/usr/bin/env python3
 
+import time
+
+# Taken as early as possible, see --startup-time
+startup_marks = {"start": time.perf_counter()}
+
 import os
 import re
 import sys
 import pwd
 
-# Requires dbus-python installed (possibly from distro's package manager)
-import dbus
-
+import atexit
 import getopt
 import logging
 import subprocess
-from logging import config
-from logging_conf import LOGGING
 
-# Load the logging configuration
-config.dictConfig(LOGGING)
-logger = logging.getLogger("LightHouse")
+import tracing
+from components import Component, ComponentRegistry
 
-# Create the notifier
-notifier = dbus.Interface(
-        object=dbus.SessionBus().get_object("org.freedesktop.Notifications", "/org/freedesktop/Notifications"),
-        dbus_interface="org.freedesktop.Notifications"
-    )
+# D-Bus (bus_manager), the logging configuration and the thread pool are imported only when needed:
+# LightHouse is usually bound to global shortcuts, keep the time from keypress to first action low.
+logger = logging.getLogger("LightHouse")
 
 
 #   _    _  _____ ______ _____   __      __     _____   _____ 
@@ -35,24 +33,52 @@ notifier = dbus.Interface(
 
 
 user = pwd.getpwuid(os.getuid())[0]
-config_path = "/home/" + user + "/.config/"
-localPath = "/home/" + user + "/.local/"
-vscode_path = "/home/" + user + "/.config/Code/User/"
+# Homes are not always in /home (e.g. lab and thin-client hosts, see --fleet)
+home_path = pwd.getpwuid(os.getuid()).pw_dir + "/"
+config_path = home_path + ".config/"
+localPath = home_path + ".local/"
+vscode_path = home_path + ".config/Code/User/"
+# LightHouse's own configuration (JSON), see load_settings()
+settings_file = config_path + "lighthouse/config.json"
+# Where LightHouse keeps what it can compute again (e.g. the state of the components)
+cache_path = home_path + ".cache/lighthouse/"
 
 # Configure the default parameters for notifications
 # See https://www.galago-project.org/specs/notification/0.9/x408.html#command-notify
 app_name = "LightHouse"
-replaces_id = 0
 info_app_icon = "system-help.svg"
 warning_app_icon = "dialog-warning-symbolic.svg"
 critical_app_icon = "dialog-error-symbolic.svg"
-summary = ""
-body = ""
-actions = []
-# See https://www.galago-project.org/specs/notification/0.9/x344.html
-# For urgency levels etc, move to the previous pages, from the one above
-hints = {"urgency" : 1}
 expire_timeout = -1
+# Scheduled runs do not show the same notification again before this many seconds
+scheduled_notification_interval = 3600
+
+# Command line options, see --help (the options of the components are added by option_table())
+short_opts : str = "hf:v"
+long_opts : list = ["help", "verbose", "startup-time", "daemon", "schedule", "timings", "trace=", "prerender-wallpapers", "fleet", "json", "watch"]
+
+# Fleet mode (--fleet): how many users are switched at once, and how long a single user may take (seconds)
+fleet_max_workers = 8
+fleet_timeout = 120
+# The variables of a user's graphical session given to their LightHouse, see session_environment()
+session_variables : tuple = ("WAYLAND_DISPLAY", "DISPLAY", "XAUTHORITY")
+
+# How long to wait for plasmashell to be back on the bus after a restart (-r), in seconds
+plasmashell_restart_timeout = 30
+
+# Timeouts, in seconds: of a D-Bus call (dbus-python waits about 25s by default), of the wallpaper script
+# (plasmashell loads the image of every screen), of the Plasma tools (lookandfeeltool...), of a whole switch
+dbus_call_timeout = 5
+wallpaper_script_timeout = 15
+plasma_apply_timeout = 30
+switch_timeout = 60
+# A D-Bus service that timed out is skipped for this many seconds (doubled at every new timeout), and the
+# components needing it are applied again by the next runs
+circuit_breaker_cooldown = 300
+
+# Apply only the parts of a Global Theme that differ from the current settings (colors, icons, Plasma
+# style...), each one through its own reload path. False always runs 'lookandfeeltool --apply'.
+selective_plasma_apply = True
 
 
 
@@ -64,174 +90,499 @@ expire_timeout = -1
 #  |_____/|______|_|  |___/
 #                          
 
-# Check if Global Theme exists
-# TODO: check presence of the gtk_theme
-def check_args(
-        plasma_theme: str,
-        gtk_theme: str,
-        wallpaper: str,
-        konsole_profile: str,
-    ) -> None:
-    """Checks if the given theme names reflect existing themes and profiles.
+def setup_logging(verbose: bool) -> None:
+    """Loads the logging configuration.
+
+    Records are only queued by the thread logging them: a background thread formats and writes them.
+    The recent DEBUG records are kept in memory whatever the verbosity, see dump_debug_log().
+
+    Args:
+        verbose (bool): True to print DEBUG messages to the console, INFO and above otherwise.
+    """
+    global _log_queue, _ring_buffer
+    import queue
+    from logging import config, handlers
+    from logging_conf import LOGGING, DeferredQueueHandler
+
+    config.dictConfig(LOGGING)
+    targets = {handler.name: handler for handler in logger.handlers}
+    targets["console"].setLevel(logging.DEBUG if verbose else logging.INFO)
+    _ring_buffer = targets["ring"]
+
+    _log_queue = queue.Queue()
+    listener = handlers.QueueListener(_log_queue, *targets.values(), respect_handler_level=True)
+    logger.handlers = [DeferredQueueHandler(_log_queue)]
+    listener.start()
+    # Registered first, run last: whatever is logged at exit is written too
+    atexit.register(listener.stop)
+
+_log_queue = None
+_ring_buffer = None
+
+def dump_debug_log() -> None:
+    """Writes the recent DEBUG records to cache_path/debug.log, e.g. when a component fails."""
+    if _ring_buffer is None:
+        return
+    # Let the records still in the queue reach the ring buffer
+    _log_queue.join()
+    try:
+        _ring_buffer.dump(cache_path + "debug.log")
+        logger.info("Diagnostics written to %s", cache_path + "debug.log")
+    except OSError as e:
+        logger.warning("Unable to write %s: %s", cache_path + "debug.log", e)
+
+def send_notification(*args) -> int:
+    """Calls the Notify method of the notification server, connecting to the session bus on first use.
+
+    The call goes to the well-known name, not to a proxy bound to the current owner: notifications keep
+    working after plasmashell restarts.
+
+    Args:
+        *args: The arguments of Notify: app_name, replaces_id, app_icon, summary, body, actions, hints
+            and expire_timeout.
+
+    Raises:
+        CallTimeout: If the notification server does not reply within dbus_call_timeout.
+        dbus.exceptions.DBusException: If the call fails.
+
+    Returns:
+        int: The id of the notification.
+    """
+    from bus_manager import session_bus
+
+    return session_bus.call(
+        "org.freedesktop.Notifications",
+        "/org/freedesktop/Notifications",
+        "org.freedesktop.Notifications",
+        "Notify",
+        *args,
+        signature="susssasa{sv}i",
+        timeout=dbus_call_timeout,
+    )
+
+def get_notifications():
+    """Returns the notification layer, see notifications.Notifications.
+
+    Messages are collected during a run and shown as a single notification, sent in the background.
+
+    Returns:
+        notifications.Notifications: The notification layer.
+    """
+    global _notifications
+    if _notifications is None:
+        from notifications import Notifications
+        _notifications = Notifications(
+            cache_path + "notifications.json",
+            send_notification,
+            app_name,
+            {"info": info_app_icon, "warning": warning_app_icon, "critical": critical_app_icon},
+            expire_timeout,
+        )
+        # Let the notifications in flight reach the notification server before exiting
+        atexit.register(_notifications.wait)
+    return _notifications
+
+_notifications = None
+
+def get_state_cache():
+    """Returns the cache of the state of the components, see state_cache.StateCache.
+
+    Returns:
+        state_cache.StateCache: The cache, loaded from disk on first use.
+    """
+    global _state_cache
+    if _state_cache is None:
+        from state_cache import StateCache
+        _state_cache = StateCache(cache_path + "state.json")
+    return _state_cache
+
+_state_cache = None
+# The components whose settings another component of the running switch replaces (see Component.overrides)
+_overridden = {}
+
+def get_circuit_breaker():
+    """Returns the circuit breaker of the D-Bus services, see circuit_breaker.CircuitBreaker.
+
+    Returns:
+        circuit_breaker.CircuitBreaker: The breaker, loaded from disk on first use.
+    """
+    global _circuit_breaker
+    if _circuit_breaker is None:
+        from circuit_breaker import CircuitBreaker
+        _circuit_breaker = CircuitBreaker(cache_path + "breaker.json", circuit_breaker_cooldown)
+    return _circuit_breaker
+
+_circuit_breaker = None
+
+def get_theme_index():
+    """Returns the index of the installed Global Themes, see theme_index.ThemeIndex.
+
+    Returns:
+        theme_index.ThemeIndex: The index, loaded from disk on first use.
+    """
+    global _theme_index
+    if _theme_index is None:
+        from theme_index import ThemeIndex
+        # Same lookup order as Plasma: the user's packages override the system ones
+        data_dirs = os.environ.get("XDG_DATA_DIRS") or "/usr/local/share:/usr/share"
+        package_dirs = [os.path.join(d, "plasma/look-and-feel") for d in reversed(data_dirs.split(":")) if d]
+        package_dirs.append(localPath + "share/plasma/look-and-feel")
+        _theme_index = ThemeIndex(cache_path + "lookandfeel.json", package_dirs)
+    return _theme_index
+
+_theme_index = None
+
+def get_profiles():
+    """Returns the named theme profiles of the configuration file, see profiles.ProfileCache.
+
+    Returns:
+        profiles.ProfileCache: The profiles, compiled on first use.
+    """
+    global _profiles
+    if _profiles is None:
+        from profiles import ProfileCache
+        _profiles = ProfileCache(
+            cache_path + "profiles.json",
+            settings_file,
+            invalid_args,
+            profile_resources,
+            {component.profile_key: component.argument for component in COMPONENTS},
+            [component.argument for component in COMPONENTS if component.path],
+        )
+    return _profiles
+
+_profiles = None
+
+def get_wallpaper_cache():
+    """Returns the cache of the pre-rendered wallpapers, see wallpaper_cache.WallpaperCache.
+
+    The cache is optional: it is enabled by a "wallpaper_cache" section in the configuration file,
+    e.g. {"max_size_mb": 512}, and needs Pillow to render the wallpapers.
+
+    Returns:
+        wallpaper_cache.WallpaperCache: The cache, None if not enabled.
+    """
+    global _wallpaper_cache
+    if _wallpaper_cache is None:
+        try:
+            options = load_settings().get("wallpaper_cache")
+        except RuntimeError as e:
+            logger.warning("[wallpaper] Wallpaper cache disabled: %s", e)
+            options = None
+        if options is None:
+            _wallpaper_cache = False
+        else:
+            from wallpaper_cache import WallpaperCache
+            _wallpaper_cache = WallpaperCache(cache_path + "wallpapers/", int(options.get("max_size_mb", 512)) << 20)
+    return _wallpaper_cache or None
+
+_wallpaper_cache = None
+
+def get_derived_themes():
+    """Returns the Konsole profiles and VSCode colors derived from color schemes, see derived_themes.DerivedThemes.
+
+    Returns:
+        derived_themes.DerivedThemes: The artifacts, built on demand.
+    """
+    global _derived_themes
+    if _derived_themes is None:
+        from derived_themes import DerivedThemes
+        _derived_themes = DerivedThemes(localPath + "share/konsole/", cache_path + "derived/")
+    return _derived_themes
+
+_derived_themes = None
+
+def configured_wallpapers() -> list:
+    """Returns the wallpapers referenced by the configuration file (profiles and schedule).
+
+    Returns:
+        list: The absolute paths of the wallpapers.
+    """
+    settings = load_settings()
+    wallpapers = []
+    for name in settings.get("profiles", {}):
+        try:
+            wallpapers.append(get_profiles().get(name)[0]["wallpaper"])
+        except RuntimeError as e:
+            logger.warning(e)
+    for phase in ("day", "night"):
+        argv = settings.get("schedule", {}).get(phase)
+        if isinstance(argv, list):
+            wallpapers.append(COMPONENTS.themes_from_options(getopt.getopt(argv, *option_table())[0])["wallpaper"])
+    return [os.path.abspath(os.path.expanduser(wallpaper)) for wallpaper in wallpapers if wallpaper]
+
+def prerender_wallpapers() -> int:
+    """Renders the configured wallpapers at the resolution of each connected screen, see get_wallpaper_cache().
+
+    Raises:
+        RuntimeError: If the wallpaper cache is not enabled.
+
+    Returns:
+        int: The number of wallpapers rendered.
+    """
+    import importlib.util
+    from wallpaper_cache import screen_resolutions
+
+    wallpaper_cache = get_wallpaper_cache()
+    if wallpaper_cache is None:
+        raise RuntimeError(f"The wallpaper cache is not enabled, add a \"wallpaper_cache\" section to {settings_file}")
+    if importlib.util.find_spec("PIL") is None:
+        raise RuntimeError("Pillow is needed to pre-render the wallpapers (python3-pillow)")
+    resolutions = screen_resolutions()
+    logger.debug("[wallpaper] Screens: %s", resolutions)
+    return wallpaper_cache.prerender(configured_wallpapers(), resolutions)
+
+def option_table() -> tuple:
+    """Returns the command line options, LightHouse's own and the ones of the components (see COMPONENTS).
+
+    Returns:
+        tuple: (short options, long options), in getopt format.
+    """
+    return short_opts + COMPONENTS.short_opts(), long_opts + COMPONENTS.long_opts()
+
+def print_help() -> None:
+    """Prints the help page, including the options of the components."""
+    entries = [
+        ("-h, --help", "Open this help page"),
+        ("PROFILE", "Apply the named profile of ~/.config/lighthouse/config.json"),
+        ("toggle", "Apply the profile applied before the current one"),
+    ] + COMPONENTS.help_entries() + [
+        ("-v, --verbose", "Verbose mode: enable DEBUG logging"),
+        ("--startup-time", "Report import, argument parsing and first action latency"),
+        ("--daemon", "Run as a daemon serving lighthouse_client.py requests"),
+        ("--schedule", "Switch between day and night themes at sunrise and sunset"),
+        ("--timings", "Print how long each step took"),
+        ("--trace = TRACE_FILE", "Write a Chrome/Perfetto trace of the run"),
+        ("--prerender-wallpapers", "Render the configured wallpapers at the resolution of each screen"),
+        ("--fleet", "Apply to every logged in user (as root), then print a report"),
+        ("--json", "Print the result of each component as JSON"),
+        ("--watch", "Re-apply the themes when another tool changes them"),
+    ]
+    print("--- LightHouse Help Page ---")
+    print("")
+    for usage, description in entries:
+        print(f"\t{usage + ':':<40}{description}")
+    print("")
+    print("--- LightHouse Help Page ---")
+
+def profile_resources(themes: dict) -> list:
+    """Returns the paths invalid_args() looks at to validate the given themes.
+
+    Args:
+        themes (dict): The keyword arguments of switch_theme().
+
+    Returns:
+        list: The paths, a compiled profile is validated again when the mtime of one of them changes.
+    """
+    paths = []
+    for component in COMPONENTS:
+        if themes.get(component.argument):
+            paths += component.resources(themes[component.argument])
+    return paths
+
+def mark_startup(phase: str) -> None:
+    """Records the time at which the given startup phase completed (only the first time).
 
     Args:
-        plasma_theme (str): The name of the Plasma Theme you want to be applied.
-        gtk_theme (str): The name of the GTK Theme you want to be applied.
-        wallpaper (str): The filename of the wallpaper you want to be applied.
-        konsole_profile (str): The name of the Konsole profile you want to be applied.
+        phase (str): The name of the phase, e.g. "import", "arguments", "first_action".
+    """
+    startup_marks.setdefault(phase, time.perf_counter())
+
+def report_startup_times() -> None:
+    """Prints how long each startup phase took, see --startup-time."""
+    start = startup_marks["start"]
+    previous = start
+    print("--- LightHouse startup times ---", file=sys.stderr)
+    for phase, label in (("import", "Imports"), ("arguments", "Argument parsing"), ("first_action", "First action")):
+        if phase not in startup_marks:
+            print(f"\t{label}:\t\tnot reached", file=sys.stderr)
+            continue
+        print(f"\t{label}:\t\t{(startup_marks[phase] - previous) * 1000:.1f} ms\t({(startup_marks[phase] - start) * 1000:.1f} ms since start)", file=sys.stderr)
+        previous = startup_marks[phase]
+    print("--- LightHouse startup times ---", file=sys.stderr)
+
+def load_settings() -> dict:
+    """Loads LightHouse's configuration file (settings_file).
+
+    Example:
+        {
+            "schedule": {
+                "latitude": 45.07,
+                "longitude": 7.69,
+                "sunrise_offset": 0,
+                "sunset_offset": 30,
+                "day": ["-p", "Aritim-Light_DEV", "-k", "Aritim-Light_DEV"],
+                "night": "dark"
+            },
+            "profiles": {
+                "dark": {
+                    "plasma": "Aritim-Dark_DEV",
+                    "gtk": "Aritim-Dark-GTK",
+                    "wallpaper": "~/Pictures/night.png",
+                    "konsole": "Aritim-Dark_DEV",
+                    "vscode": "Aritim Dark"
+                }
+            }
+        }
+
+    Raises:
+        RuntimeError: If the configuration file cannot be read or parsed.
+
+    Returns:
+        dict: The configuration, empty if the file does not exist.
+    """
+    import json
+
+    try:
+        with open(settings_file, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        raise RuntimeError(f"Unable to read the configuration file {settings_file}: {e}")
+
+def check_plasma_theme(plasma_theme: str) -> None:
+    """Checks that a Global Theme with the given name is installed.
 
     Raises:
-        RuntimeError: Cannot check Global Theme presence, is lookandfeeltool installed?
         RuntimeError: Cannot find a Global Theme with the given name...
+    """
+    with tracing.span("theme index lookup", theme=plasma_theme):
+        found = plasma_theme in get_theme_index()
+    if not found:
+        raise RuntimeError("Cannot find a Global Theme with the given name...")
+
+def check_wallpaper(wallpaper: str) -> None:
+    """Checks that the wallpaper exists, with a single stat (no scan of its directory).
+
+    Raises:
         RuntimeError: Cannot find a wallpaper with the given filename...
+    """
+    if not os.path.isfile(wallpaper):
+        raise RuntimeError("Cannot find a wallpaper with the given filename...")
+
+def check_konsole_profile(konsole_profile: str) -> None:
+    """Checks that the Konsole profile exists, with a single stat (no scan of its directory).
+
+    Raises:
         RuntimeError: Cannot find a Konsole profile with the given filename...
-    """    
-    # Check plasma_theme
-    if plasma_theme:
-        try:
-            res = subprocess.run(args=["lookandfeeltool", "-l"], text=True, capture_output=True)
-            res = res.stdout.split("\n")
-            logger.debug(f"lookandfeeltool output: {res}")
-        except subprocess.CalledProcessError:
-            raise RuntimeError("Cannot check Global Theme presence, is lookandfeeltool installed?")
-        if plasma_theme not in res:
-            raise RuntimeError("Cannot find a Global Theme with the given name...")
-    else:
-        # No plasma_theme Provided
-        pass
-
-    # Check GTK Theme
-    # TODO
-
-    # Check Wallpaper
-    if wallpaper:
-        found = False
-        ## Separate path and filename
-        path, filename = os.path.split(wallpaper)
-
-        scandir_iterator = os.scandir(path)  # Reinitialize the generator
-        for item in scandir_iterator :
-            if os.path.isfile(item.path) and item.name == filename:
-                found = True
-                break
-        if not found:
-            raise RuntimeError("Cannot find a wallpaper with the given filename...")
-    else:
-        # No Wallpaper provided
-        pass
-
-    # Check Konsole Profile
-    if konsole_profile:
-        found = False
-        scandir_iterator = os.scandir(localPath+"share/konsole/")  # Reinitialize the generator
-        for item in scandir_iterator :
-            if os.path.isfile(item.path) and item.name == konsole_profile+".profile":
-                found = True
-                break
-        if not found:
-            raise RuntimeError("Cannot find a Konsole profile with the given filename...")
-    else:
-        # No Konsole Theme provided
-        pass
-
-def check_config_files(
-        path: str,
-        filename: str,
-        configuration_string:str,
-        theme_name: str,
-    ) -> bool:
-    """Reads a configuration file and checks if a given theme has been correctly applied.
-
-    This can be used to check if writing to a confi file has been done correctly or if a theme has
-    already been applied previously.
+    """
+    if not os.path.isfile(localPath + "share/konsole/" + konsole_profile + ".profile"):
+        raise RuntimeError("Cannot find a Konsole profile with the given filename...")
+
+@tracing.traced
+def invalid_args(themes: dict) -> dict:
+    """Checks all the given themes, and tells which ones do not reflect existing themes and profiles.
+
+    The checks are independent and run concurrently: on network-mounted homes each one costs a round trip.
 
     Args:
-        path (str): The path pointing to the configuration file.
-        filename (str): The filename of the configuration file.
-        configuration_string (str): The configuration string to look for that prepends the theme name.
-        theme_name (str): The theme name string that folows the configuration string.
+        themes (dict): The keyword arguments of switch_theme().
 
     Returns:
-        bool: False if the theme cannot be found in the configuration file, True otherwise.
-    """    
-    with open(path + filename, "r") as file:
-        string_found = re.findall(configuration_string + "[A-z 0-9 \.\-\,=:_]*", str(file.readlines()))[0]
-        #[:-2]
-        string_found = str.replace(string_found, "\n", "")
-        string_found = str.replace(string_found, "\\n","")
-        if (string_found == configuration_string + theme_name):
-            # The theme has been already applied correctly
-            file.close()
-            return True
-        else:
-            # Continue updating with the new theme
-            file.close()
-            return False
-
-def update_file(
-        path: str,
-        filename: str,
-        configuration_string: str,
-        string_to_add: str,
-    ) -> bool:
-    """Updates a configuration file with the given theme name.
+        dict: Maps each argument whose theme cannot be found to the reason, in the order of COMPONENTS.
+            Empty if all the themes exist.
+    """
+    from concurrent import futures
+
+    checks = [
+        (component, themes[component.argument])
+        for component in COMPONENTS
+        if component.can_check and themes.get(component.argument)
+    ]
+    if not checks:
+        return {}
+    invalid = {}
+    with futures.ThreadPoolExecutor(max_workers=len(checks)) as executor:
+        for component, future in [(component, executor.submit(component.check, value)) for component, value in checks]:
+            try:
+                future.result()
+            except (RuntimeError, OSError) as e:
+                invalid[component.argument] = str(e)
+    return invalid
+
+def check_args(themes: dict) -> None:
+    """Checks if the given theme names reflect existing themes and profiles, see invalid_args().
 
     Args:
-        path (str): The path pointing to the configuration file.
-        filename (str): The filename of the configuration file.
-        configuration_string (str): The configuration string to look for that prepends the theme name.
-        string_to_add (str): The theme name string that folows the configuration string.
+        themes (dict): The keyword arguments of switch_theme().
 
-    Returns:
-        bool: False if no string mentioning the theme can be found, True if the file has been updated correctly.
-    """
-    with open(path+filename, "r") as f:
-        # [A-z \.-]*
-        # [A-z \.\-0-9);]*
-
-        # current_theme contains the entire line found in the file, to be modified
-        current_theme = re.findall(configuration_string + "[A-z \.,\-0-9();\"β]*", str(f.readlines()))[0][:-2]
-        logger.debug(f"current_theme: {current_theme}")
-
-    with open(path+filename, "r") as f:
-        s = f.read()
-        if current_theme not in s:
-            logger.error(f"Error while looking for a previous valid theme in the DE configs file.")
-            return False
-
-    # Safely write the changed content, if found in the file
-    with open(path+filename, 'w') as f:
-        # Let's define the new line that will entirely substitute current_theme
-        s = s.replace(current_theme, configuration_string.replace("\\", "") + string_to_add)
-        f.write(s)
-    logger.debug(f"updated_theme: " + configuration_string.replace("\\", "") + string_to_add)
-    return True
+    Raises:
+        RuntimeError: Cannot find a Global Theme with the given name...
+        RuntimeError: Cannot find a wallpaper with the given filename...
+        RuntimeError: Cannot find a Konsole profile with the given filename...
+    """
+    invalid = invalid_args(themes)
+    if invalid:
+        # The error of the first failed check
+        raise RuntimeError(next(iter(invalid.values())))
 
+@tracing.traced
 def set_plasma_global_theme(plasma_theme: str) -> bool:
     """Sets the Plasma's Global Theme.
 
+    With selective_plasma_apply, only the settings of the theme that differ from the current ones are
+    applied (see lookandfeel.py): switching between two themes sharing their icons or their window
+    decorations does not reload them. 'lookandfeeltool' is used when the theme holds settings that
+    cannot be applied this way, or if applying them fails.
+
     Args:
         plasma_theme (str): The name of the Plasma GLobal Theme to be applied.
 
     Raises:
         RuntimeError: Error when applying the theme, is 'lookandfeeltool' installed in the system?
+        CallTimeout: If applying the theme takes longer than plasma_apply_timeout.
 
     Returns:
         bool: False if the 'kdeglobals' file cannot be updated: the theme is applied but the system
             is not anymore aware of the changes. True otherwise.
     """
-    try:
-        subprocess.run(args=["lookandfeeltool", "--apply", plasma_theme], text=True, capture_output=True)
-    except subprocess.CalledProcessError: raise
-    
+    from kconfig import update_kconfig
+    from bus_manager import session_bus, CallTimeout
+
+    package = get_theme_index().get(plasma_theme) if selective_plasma_apply else None
+    applied = False
+    if package is not None and package.get("defaults"):
+        import lookandfeel
+
+        try:
+            with tracing.span("selective apply", theme=plasma_theme):
+                changes = lookandfeel.pending_changes(config_path, lookandfeel.package_defaults(package["defaults"]))
+                logger.debug("[plasma] Changing: %s", ", ".join(sorted(changes)) or "nothing")
+                lookandfeel.apply_changes(config_path, changes, plasma_apply_timeout)
+            applied = True
+        except CallTimeout:
+            raise
+        except (OSError, RuntimeError) as e:
+            logger.warning("[plasma] Falling back to lookandfeeltool: %s", e)
+
+    if not applied:
+        try:
+            with tracing.span("lookandfeeltool --apply", theme=plasma_theme):
+                completed = subprocess.run(
+                    args=["lookandfeeltool", "--apply", plasma_theme],
+                    text=True,
+                    capture_output=True,
+                    timeout=session_bus.remaining(plasma_apply_timeout),
+                )
+        except subprocess.TimeoutExpired:
+            raise CallTimeout(f"Timed out: lookandfeeltool did not complete within {plasma_apply_timeout}s")
+        except OSError as e:
+            raise RuntimeError(f"Unable to run lookandfeeltool: {e}")
+        if completed.returncode != 0:
+            # Nothing was applied: kdeglobals must not claim otherwise
+            raise RuntimeError(f"lookandfeeltool failed ({completed.returncode}): {completed.stderr.strip()}")
+
     # Update "kdeglobals" file
-    # Example: LookAndFeelPackage=Aritim-Dark_DEV
-    if update_file(config_path, "kdeglobals", "LookAndFeelPackage=", plasma_theme) is False:
-        logger.error(f"Something went wrong when setting Plasma Global theme...")
+    # Example: [KDE] LookAndFeelPackage=Aritim-Dark_DEV
+    try:
+        update_kconfig(config_path + "kdeglobals", {("KDE", "LookAndFeelPackage"): plasma_theme})
+    except OSError as e:
+        logger.error("Something went wrong when setting Plasma Global theme... (%s)", e)
         return False
-    else:
-        return True
+    return True
 
+@tracing.traced
 def set_gtk_theme(gtk_theme: str) -> None:
     """Set the GTK theme.
 
@@ -240,18 +591,19 @@ def set_gtk_theme(gtk_theme: str) -> None:
 
     Raises:
         RuntimeError: If unable to set GTK theme.
+        CallTimeout: If kded does not reply in time.
     """    
+    import dbus
+    from bus_manager import session_bus
+
     # See https://old.reddit.com/r/kde/comments/slizni/changing_gnomegtk_application_style_theme_from/
     # dbus-send --session --dest=org.kde.GtkConfig --type=method_call /GtkConfig org.kde.GtkConfig.setGtkTheme 'string:themes_name_goes_here'
     try:
-        interface = dbus.Interface(
-                dbus.SessionBus().get_object("org.kde.GtkConfig", "/GtkConfig"),
-                dbus_interface="org.kde.GtkConfig"
-            )
-        interface.setGtkTheme(gtk_theme)
-    except:
-        raise RuntimeError(f"Unable to set GTK theme! gtk_theme: {gtk_theme}")
+        session_bus.call("org.kde.GtkConfig", "/GtkConfig", "org.kde.GtkConfig", "setGtkTheme", gtk_theme, signature="s")
+    except dbus.exceptions.DBusException as e:
+        raise RuntimeError(f"Unable to set GTK theme! gtk_theme: {gtk_theme}, error: {e}")
 
+@tracing.traced
 def set_wallpaper(wallpaper: str) -> None:
     """Set the wallpaper.
 
@@ -260,27 +612,64 @@ def set_wallpaper(wallpaper: str) -> None:
 
     Raises:
         RuntimeError: If unable to set wallpaper.
+        CallTimeout: If plasmashell does not reply within wallpaper_script_timeout.
     """    
+    import json
+    import dbus
+    from bus_manager import session_bus
+
+    # Give each desktop the pre-rendered variant of its screen, if any, so that plasmashell does not have to
+    # decode and scale the original (see get_wallpaper_cache()). The variants are cropped to the physical
+    # resolution of the screens: they are only used with the "Scaled and Cropped" fill mode (FillMode 2, the
+    # default). A screen matches the variant of its exact size; a scaled screen (its geometry is logical)
+    # matches the largest variant with its aspect ratio
+    variants = []
+    wallpaper_cache = get_wallpaper_cache()
+    if wallpaper_cache is not None:
+        from wallpaper_cache import screen_resolutions
+        variants = wallpaper_cache.lookup(wallpaper, screen_resolutions())
+        logger.debug("[wallpaper] Pre-rendered variants: %s", variants)
+
     # See https://old.reddit.com/r/kde/comments/65pmhj/change_wallpaper_from_terminal/
     jscript = f"""
+        var variants = {json.dumps(variants)};
         var allDesktops = desktops();
         print (allDesktops);
         for (i=0;i<allDesktops.length;i++) {{
             d = allDesktops[i];
             d.wallpaperPlugin = "org.kde.image";
             d.currentConfigGroup = Array("Wallpaper", "org.kde.image", "General");
-            d.writeConfig("Image", "{wallpaper}")
+            var image = {json.dumps(wallpaper)};
+            var fillMode = d.readConfig("FillMode");
+            if (fillMode === undefined || fillMode === null || fillMode === "" || fillMode == 2) {{
+                var screen = screenGeometry(d.screen);
+                var match = null;
+                for (j=0;j<variants.length;j++) {{
+                    if (variants[j][0] == screen.width && variants[j][1] == screen.height) {{
+                        match = variants[j];
+                        break;
+                    }}
+                    if (Math.abs(variants[j][0] / variants[j][1] - screen.width / screen.height) < 0.01 && (match === null || variants[j][0] > match[0])) {{
+                        match = variants[j];
+                    }}
+                }}
+                if (match !== null) {{
+                    image = match[2];
+                }}
+            }}
+            d.writeConfig("Image", image)
         }}
     """
     try:
-        interface = dbus.Interface(
-            dbus.SessionBus().get_object("org.kde.plasmashell", "/PlasmaShell"),
-            dbus_interface="org.kde.PlasmaShell"
+        session_bus.call(
+            "org.kde.plasmashell", "/PlasmaShell", "org.kde.PlasmaShell", "evaluateScript", jscript,
+            signature="s",
+            timeout=wallpaper_script_timeout,
         )
-        interface.evaluateScript(jscript)
-    except:
-        raise RuntimeError(f"Unable to set wallpaper! wallpaper: {wallpaper}")
+    except dbus.exceptions.DBusException as e:
+        raise RuntimeError(f"Unable to set wallpaper! wallpaper: {wallpaper}, error: {e}")
 
+@tracing.traced
 def set_konsole(konsole_profile: str) -> None:
     """Set Konsole profile.
 
@@ -288,130 +677,876 @@ def set_konsole(konsole_profile: str) -> None:
         konsole_profile (str): The name of the Konsole profile to be set.
 
     Raises:
-        RuntimeError: Unable to get the sessions for the given PID.
-        RuntimeError: No sessions found.
-        RuntimeError: Unable to set Konsole profile for this session.
+        RuntimeError: Unable to set Konsole profile for some sessions (all the errors are reported together).
         RuntimeError: Something went wrong when setting Konsole profile.
+        CallTimeout: Some Konsole instances did not reply in time (the others got the profile).
     """
-    # Get the PIDs of all Konsole's processes running
-    try:
-        res = subprocess.run(args=["pidof", "konsole"], capture_output=True)
-    except subprocess.CalledProcessError: raise
+    from kconfig import update_kconfig
+    from bus_manager import session_bus, CallTimeout
+
+    # Every Konsole window (i.e. process) registers itself on the bus as org.kde.konsole-<PID>
+    konsole_names = [name for name in session_bus.list_names() if name.startswith("org.kde.konsole")]
+    logger.debug("Konsole instances: %s", konsole_names)
 
-    pids = str(res.stdout, "UTF-8").replace("\n", "").split()
-    logger.debug(f"PIDs: {pids}")
-    # Now, for each Konsole qindow (i.e. PID), get how many sessions there are and their unique number
+    errors = []
+    timed_out = set()
+    # Now, for each Konsole instance, get how many sessions there are and their unique number
     session_extractor = re.compile("<node name=\"([0-9]*)\"\/>")
-    for pid in pids:
-        output_string = ""
-        try:
-            interface = dbus.Interface(
-                dbus.SessionBus().get_object(f"org.kde.konsole-{pid}", "/Sessions"),
-                dbus_interface="org.freedesktop.DBus.Introspectable"
-            )
-            output_string = interface.Introspect()
-        except:
-            raise RuntimeError(f"Unable to get the sessions for the given PID! PID: {pid}")
-        # try:
-        #     res = subprocess.run(
-        #         args=[
-        #             "dbus-send",
-        #             "--session",
-        #             f"--dest=org.kde.konsole-{pid}",
-        #             "--type=method_call",
-        #             "--print-reply",
-        #             f"/Sessions",
-        #             "org.freedesktop.DBus.Introspectable.Introspect",
-        #         ],
-        #         capture_output=True
-        #     )
-        # except subprocess.CalledProcessError: raise
-
-        # output_lines = str(res.stdout, "UTF-8").split("\n")
-        # output_string = str(res.stdout, "UTF-8")
-        if output_string:
-            session_list = re.findall(session_extractor, output_string)
-        else:
+    # The windows are introspected in the same batch: each one gets the profile as its default, so that
+    # the tabs opened later use it too (older Konsole versions lack setDefaultProfile, that is fine)
+    introspections = session_bus.call_many_async(
+        [(name, "/Sessions", "org.freedesktop.DBus.Introspectable", "Introspect", ()) for name in konsole_names]
+        + [(name, "/Windows", "org.freedesktop.DBus.Introspectable", "Introspect", ()) for name in konsole_names],
+    )
+    window_calls = []
+    for name, (reply, error) in zip(konsole_names, introspections[len(konsole_names):]):
+        if error is None:
+            window_calls += [
+                (name, f"/Windows/{window}", "org.kde.konsole.Window", "setDefaultProfile", (konsole_profile,))
+                for window in re.findall(session_extractor, str(reply[0]))
+            ]
+    profile_calls = []
+    for name, (reply, error) in zip(konsole_names, introspections):
+        if error is not None:
+            errors.append(f"Unable to get the sessions for the given instance! instance: {name}, error: {error}")
+            if isinstance(error, CallTimeout):
+                timed_out.add(name)
+            continue
+        session_list = re.findall(session_extractor, str(reply[0]))
+        if not session_list:
             # No sessions found, this is impossilble!
-            logger.error(f"output_string: {output_string}")
-            raise RuntimeError("No sessions found!")
-
-        logger.debug(f"session_list: {session_list}")
-        # For each Konsole process, change its profile.
+            errors.append(f"No sessions found! instance: {name}")
+            continue
+        logger.debug("Konsole instance: %s, session_list: %s", name, session_list)
+        # Change the profile of every session.
         # This applies the theme to all Konsole windows and sessions currently opened
-        for session in session_list:
-            logger.debug(f"Konsole PID: {pid}")
-            logger.debug(f"Konsole session: {session}")
-
-            output_string = ""
-            try:
-                interface = dbus.Interface(
-                    dbus.SessionBus().get_object(f"org.kde.konsole-{pid}", f"/Sessions/{session}"),
-                    dbus_interface="org.kde.konsole.Session"
-                )
-                interface.setProfile(konsole_profile)
-            except:
-                raise RuntimeError(f"Unable to set Konsole profile for this session! konsole_profile: {konsole_profile}, session: {session}")
-            # try:
-            #     subprocess.run(
-            #         args=[
-            #             "dbus-send",
-            #             "--session",
-            #             f"--dest=org.kde.konsole-{pid}",
-            #             "--type=method_call",
-            #             f"/Sessions/{session}",
-            #             "org.kde.konsole.Session.setProfile",
-            #             f"string:{konsole_profile}",
-            #         ]
-            #     )
-            # except subprocess.CalledProcessError: raise
+        profile_calls += [
+            (name, f"/Sessions/{session}", "org.kde.konsole.Session", "setProfile", (konsole_profile,))
+            for session in session_list
+        ]
+
+    replies = session_bus.call_many_async(profile_calls + window_calls)
+    for (name, object_path, *_), (_, error) in zip(window_calls, replies[len(profile_calls):]):
+        if error is not None:
+            logger.debug("Unable to set the default profile of this window: instance: %s, window: %s, error: %s", name, object_path, error)
+    for (name, object_path, *_), (_, error) in zip(profile_calls, replies):
+        if error is not None:
+            errors.append(f"Unable to set Konsole profile for this session! konsole_profile: {konsole_profile}, instance: {name}, session: {object_path}, error: {error}")
+            if isinstance(error, CallTimeout):
+                timed_out.add(name)
 
     # Now, change the default Konsole profile (this will be applied to all freshly spawned windows)
-    filename = "/konsolerc"
-    if update_file(config_path, filename, "DefaultProfile=", konsole_profile + ".profile") is False:
-        logger.error(f"Something went wrong when setting Konsole profile...")
-        raise RuntimeError("Something went wrong when setting Konsole profile...")
-
+    try:
+        update_kconfig(config_path + "konsolerc", {("Desktop Entry", "DefaultProfile"): konsole_profile + ".profile"})
+    except OSError as e:
+        errors.append(f"Something went wrong when updating the default Konsole profile... ({e})")
+
+    if errors:
+        for error in errors:
+            logger.error(error)
+        if timed_out:
+            raise CallTimeout(f"Timed out: no reply from {len(timed_out)} Konsole instances ({len(errors)} errors)")
+        raise RuntimeError(f"Something went wrong when setting Konsole profile... ({len(errors)} errors)")
+
+@tracing.traced
 def set_vscode(vscode_theme: str) -> bool:
     """Set the VSCode theme and set the PDF webview light or dark.
 
+    Both settings are changed with a single read and a single atomic write of 'settings.json',
+    leaving its formatting and comments untouched. The colors set by --derived-colors, if any, are
+    removed in the same write (see set_derived_colors()).
+
     Args:
         vscode_theme (str): The name of the VSCode theme.
 
     Returns:
         bool: False if unable to set the VSCode theme or the PDF webview, True is everything completed successfully.
-    """    
+    """
+    from jsonc import update_jsonc, KEEP
+
+    previous_theme = []
+
+    def set_theme(theme):
+        previous_theme.append(theme)
+        return vscode_theme
+
+    def switch_invert(invert):
+        # Only when the theme actually changes: the component also runs again when VSCode rewrites the file
+        if previous_theme[0] == vscode_theme:
+            return KEEP
+        return 0 if invert == 1 else 1
+
     # "workbench.colorTheme": "GitHub Plus",
-    filename = "settings.json"
-    if update_file(vscode_path, filename, "\"workbench.colorTheme\":", " \""+vscode_theme+"\",") is False:
-        logger.error(f"Something went wrong when setting VSCode theme...")
+    updates = {
+        "workbench.colorTheme": set_theme,
+        # Switch the PDF webview between light and dark at every theme change
+        "latex-workshop.view.pdf.invert": switch_invert,
+    }
+    derived_themes = get_derived_themes()
+    # Unless --derived-colors sets them again right after, in the same switch
+    restore = "vscode" not in _overridden and derived_themes.has_vscode_colors
+    if restore:
+        updates["workbench.colorCustomizations"] = lambda current: derived_themes.restore_vscode_colors(current if isinstance(current, dict) else {})
+    try:
+        previous = update_jsonc(vscode_path + "settings.json", updates)
+        if restore:
+            derived_themes.forget_vscode_colors()
+    except (OSError, ValueError) as e:
+        logger.error("Something went wrong when setting VSCode theme... (%s)", e)
         return False
+    logger.debug("Previous VSCode settings: %s", previous)
+    return True
 
-    if check_config_files(vscode_path, filename, "\"latex-workshop.view.pdf.invert\":", f" {str(1)},") is True:
-        logger.debug(f"1 --> 0")
-        if update_file(vscode_path, filename, "\"latex-workshop.view.pdf.invert\":", f" {str(0)},") is False:
-            logger.error(f"Something went wrong when setting VSCode PDF webview theme...")
-            return False
-        else:
-            return  True
-    else:
-        logger.debug(f"0 --> 1")
-        if update_file(vscode_path, filename, "\"latex-workshop.view.pdf.invert\":", f" {str(1)},") is False:
-            logger.error(f"Something went wrong when setting VSCode PDF webview theme...")
-            return False
-        else:
-            return True
+def active_color_scheme() -> str:
+    """Returns the color scheme file of the active Global Theme.
+
+    The scheme is the one the package ships (contents/colors) or names in its defaults, the one of
+    kdeglobals otherwise. It is looked up like Plasma does: the user's schemes first, then the system ones.
+
+    Raises:
+        RuntimeError: If the color scheme cannot be found.
+
+    Returns:
+        str: The path of the .colors file.
+    """
+    from kconfig import read_kconfig
+
+    name = None
+    package = get_theme_index().get(read_plasma_theme() or "")
+    if package is not None:
+        shipped = os.path.join(package["path"], "contents", "colors")
+        if os.path.isfile(shipped):
+            return shipped
+        if package.get("defaults"):
+            import lookandfeel
+            try:
+                name = lookandfeel.package_defaults(package["defaults"]).get(("kdeglobals", "General", "ColorScheme"))
+            except OSError as e:
+                logger.debug("[derived] Unable to read %s: %s", package["defaults"], e)
+    if not name:
+        name = read_kconfig(config_path + "kdeglobals", [("General", "ColorScheme")])[("General", "ColorScheme")]
+    if not name:
+        raise RuntimeError("No color scheme set in kdeglobals")
+
+    data_dirs = os.environ.get("XDG_DATA_DIRS") or "/usr/local/share:/usr/share"
+    for directory in [localPath + "share"] + [d for d in data_dirs.split(":") if d]:
+        path = os.path.join(directory, "color-schemes", name + ".colors")
+        if os.path.isfile(path):
+            return path
+    raise RuntimeError(f"Cannot find the color scheme {name}")
+
+@tracing.traced
+def set_derived_colors(enabled: bool = True) -> None:
+    """Gives Konsole and VSCode the colors of the active Global Theme.
+
+    A Konsole profile and VSCode color overrides are derived from the color scheme of the Global Theme
+    (see get_derived_themes()): built the first time a scheme is used, then only referenced. The Konsole
+    profile is applied like -k, the overrides are merged into "workbench.colorCustomizations". The user's
+    colors they replace are put back by the next run applying -c (or -k) without --derived-colors.
 
-def rstPlasmashell() -> None:
-    """Resets 'plasmashell'. This may come handy in case of cache issues or themes not completely be applied.
+    Args:
+        enabled (bool, optional): False to do nothing (see switch_theme()). Defaults to True.
+
+    Raises:
+        RuntimeError: If the color scheme cannot be found or read, or the artifacts cannot be applied.
+    """
+    from jsonc import update_jsonc
+
+    if not enabled:
+        return
+    scheme_file = active_color_scheme()
+    try:
+        artifacts = get_derived_themes().get(scheme_file)
+    except (OSError, ValueError) as e:
+        raise RuntimeError(f"Unable to derive the colors of {scheme_file}: {e}")
+    logger.debug("[derived] %s: %s", scheme_file, artifacts["konsole_profile"])
+
+    if read_konsole_profile() != artifacts["konsole_profile"]:
+        set_konsole(artifacts["konsole_profile"])
+    try:
+        update_jsonc(vscode_path + "settings.json", {
+            "workbench.colorCustomizations": lambda current: get_derived_themes().override_vscode_colors(
+                current if isinstance(current, dict) else {},
+                artifacts["vscode_colors"],
+            ),
+        })
+    except (OSError, ValueError) as e:
+        raise RuntimeError(f"Unable to set the VSCode colors: {e}")
+
+def rstPlasmashell(restart: bool = True) -> None:
+    """Restarts 'plasmashell' and waits until it is back on the bus. This may come handy in case of cache
+    issues or themes not completely be applied.
+
+    The new plasmashell is detached from LightHouse. The wait ends as soon as it owns org.kde.plasmashell
+    (see bus_manager.SessionBusManager.wait_for_new_owner()), not after a fixed delay.
+
+    Args:
+        restart (bool, optional): False to do nothing (see switch_theme()). Defaults to True.
 
     Raises:
         RuntimeError: If unable to restart 'plasmashell'.
+        CallTimeout: If 'plasmashell' is not back within plasmashell_restart_timeout.
+    """
+    from bus_manager import session_bus, CallTimeout
+
+    if not restart:
+        return
+
+    def start():
+        subprocess.Popen(
+            args=["plasmashell", "--replace"],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+
+    started = time.monotonic()
+    timeout = session_bus.remaining(plasmashell_restart_timeout)
+    try:
+        ready = session_bus.wait_for_new_owner("org.kde.plasmashell", start, timeout)
+    except OSError as e:
+        raise RuntimeError(f"Unable to restart 'plasmashell': {e}")
+    if not ready:
+        raise CallTimeout(f"Timed out: 'plasmashell' is not back after {timeout:.0f}s")
+    logger.debug("[plasmashell] Back after %.2fs", time.monotonic() - started)
+
+def read_plasma_theme() -> str:
+    """Reads the Global Theme from kdeglobals, see --watch."""
+    from kconfig import read_kconfig
+    return read_kconfig(config_path + "kdeglobals", [("KDE", "LookAndFeelPackage")])[("KDE", "LookAndFeelPackage")]
+
+def read_konsole_profile() -> str:
+    """Reads the default Konsole profile from konsolerc, see --watch."""
+    from kconfig import read_kconfig
+    profile = read_kconfig(config_path + "konsolerc", [("Desktop Entry", "DefaultProfile")])[("Desktop Entry", "DefaultProfile")]
+    return profile[:-len(".profile")] if profile and profile.endswith(".profile") else profile
+
+def read_vscode_theme() -> str:
+    """Reads the VSCode theme from settings.json, see --watch."""
+    from jsonc import read_jsonc
+    return read_jsonc(vscode_path + "settings.json", ["workbench.colorTheme"])["workbench.colorTheme"]
+
+# The components LightHouse switches, in the order of --help. Each one declares its option, how to check,
+# probe (the files of the state cache) and apply its theme, and the components it waits for when they are
+# requested too: applying the Global Theme may overwrite the GTK theme and the Konsole profile, so it goes
+# first; plasmashell is restarted (-r) once the Global Theme is applied, the wallpaper is set once it is
+# back. Everything else is independent and is applied concurrently. A component can only depend on the
+# ones registered before it.
+# A new target can live in its own module, given as "module:function" strings (e.g. apply="kate:set_kate"):
+# it is only imported by the runs that switch it.
+COMPONENTS = ComponentRegistry()
+COMPONENTS.register(Component(
+    "plasma", "plasma_theme", "p", "plasma", "Apply Plasma Global Theme",
+    set_plasma_global_theme,
+    metavar="PLASMA_GLOBAL_THEME",
+    check=check_plasma_theme,
+    files=lambda: [config_path + "kdeglobals"],
+    # Installing or removing a Global Theme changes the mtime of its parent directory
+    resources=lambda theme: get_theme_index().package_dirs,
+    read=read_plasma_theme,
+    failure_message="Error when applying Plasma's Global Theme, is 'lookandfeeltool' installed?",
+    partial_message="Plasma's Global Theme applied, but configuration not updated!",
+))
+COMPONENTS.register(Component(
+    # An action rather than a state (no files): never skipped
+    "plasmashell", "restart_plasmashell", "r", "restart-plasmashell", "Restart plasmashell after the Global Theme, before the wallpaper",
+    rstPlasmashell,
+    depends=["plasma"],
+    profile_key="restart_plasmashell",
+    failure_message="Unable to restart 'plasmashell'",
+))
+COMPONENTS.register(Component(
+    "gtk", "gtk_theme", "g", "gtk", "Apply gtk_theme",
+    set_gtk_theme,
+    metavar="GTK_THEME",
+    # TODO: check presence of the gtk_theme
+    files=lambda: [config_path + "gtk-3.0/settings.ini"],
+    depends=["plasma"],
+    failure_message="Error when applying GTK theme...",
+))
+COMPONENTS.register(Component(
+    "wallpaper", "wallpaper", "w", "wallpaper", "Apply Wallpaper (indicate /path/to/file)",
+    set_wallpaper,
+    metavar="WALLPAPER",
+    check=check_wallpaper,
+    files=lambda: [config_path + "plasma-org.kde.plasma.desktop-appletsrc"],
+    resources=lambda wallpaper: [wallpaper],
+    depends=["plasmashell"],
+    path=True,
+    failure_message="Error when applying wallpaper...",
+))
+COMPONENTS.register(Component(
+    "konsole", "konsole_profile", "k", "konsole", "Apply Konsole Profile",
+    set_konsole,
+    metavar="KONSOLE_PROFILE",
+    check=check_konsole_profile,
+    files=lambda: [config_path + "konsolerc"],
+    resources=lambda profile: [localPath + "share/konsole/" + profile + ".profile"],
+    read=read_konsole_profile,
+    depends=["plasma"],
+    failure_message="Error when applying Konsole Profile...",
+))
+COMPONENTS.register(Component(
+    "vscode", "vscode_theme", "c", "vscode", "Apply VSCode Theme",
+    set_vscode,
+    metavar="VSCODE_THEME",
+    files=lambda: [vscode_path + "settings.json"],
+    read=read_vscode_theme,
+    failure_message="Unable to set VSCode theme or PDF preview...",
+))
+COMPONENTS.register(Component(
+    # Replaces the Konsole profile and the VSCode colors: applied after them when they are requested too.
+    # The color scheme depends on the Global Theme (kdeglobals): cheap once the artifacts exist
+    "derived", "derived_colors", "", "derived-colors", "Derive the Konsole profile and VSCode colors from the Global Theme",
+    set_derived_colors,
+    files=lambda: [config_path + "kdeglobals", config_path + "konsolerc", vscode_path + "settings.json"],
+    depends=["plasma", "konsole", "vscode"],
+    # -k and -c without --derived-colors put the profile and the user's colors back, see set_vscode()
+    overrides=["konsole", "vscode"],
+    profile_key="derived_colors",
+    failure_message="Unable to derive the Konsole profile and VSCode colors...",
+))
+
+def apply_components(components: dict) -> dict:
+    """Applies the given components concurrently, honouring their dependencies (see COMPONENTS).
+
+    A component is started as soon as all the components it depends on (among the requested ones)
+    have completed, whatever their outcome. A failing component never aborts the others.
+
+    Args:
+        components (dict): Maps a component name (see COMPONENTS) to a callable applying it.
+
+    Returns:
+        dict: Maps each component name to a (result, exception) tuple: result is the value returned by
+            the callable, exception is the exception it raised (None on success).
+    """
+    from concurrent import futures
+
+    results = {}
+    pending = dict(components)
+    running = {}
+    with futures.ThreadPoolExecutor(max_workers=max(len(components), 1)) as executor:
+        while pending or running:
+            # Start every component whose dependencies are all done
+            for name in list(pending):
+                if all(dep in results or dep not in components for dep in COMPONENTS[name].depends):
+                    logger.debug("[apply] Starting component: %s", name)
+                    mark_startup("first_action")
+                    running[executor.submit(pending.pop(name))] = name
+
+            done, _ = futures.wait(running, return_when=futures.FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                exception = future.exception()
+                if exception is not None:
+                    logger.debug("[apply] Component %s failed: %s", name, exception)
+                    results[name] = (None, exception)
+                else:
+                    logger.debug("[apply] Component %s done", name)
+                    results[name] = (future.result(), None)
+    return results
+
+@tracing.traced
+def switch_theme(validate: bool = True, **themes) -> dict:
+    """Validates and applies the given themes, notifying the user about any failure.
+
+    Empty theme names are left untouched, as well as the components already in the desired state
+    (see get_state_cache()). The whole switch is bounded by switch_timeout: a component not started
+    by then, or timing out, is reported as such and applied again by the next run.
+
+    Args:
+        validate (bool, optional): False to skip the checks of the components, when the themes are known to exist. Defaults to True.
+        **themes: The theme of each component, keyed by its argument (see COMPONENTS), e.g.
+            plasma_theme="Aritim-Dark_DEV", restart_plasmashell=True. The missing ones are left untouched.
+
+    Raises:
+        TypeError: If a theme is given for an unknown component.
+
+    Returns:
+        dict: The results of apply_components(), plus a ("skipped", None) result for every component
+            that was already in the desired state.
+    """
+    unknown = set(themes) - {component.argument for component in COMPONENTS}
+    if unknown:
+        raise TypeError(f"Unknown components: {', '.join(sorted(unknown))}")
+    requested = {component.name: themes.get(component.argument) for component in COMPONENTS}
+    # A component whose settings are replaced by another one of this switch is in a state of its own:
+    # "-k PROFILE" and "-k PROFILE --derived-colors" do not leave konsolerc the same
+    overridden = {other: c.name for c in COMPONENTS if requested[c.name] for other in c.overrides}
+    states = {name: [value, overridden[name]] if name in overridden else value for name, value in requested.items()}
+    # Skip the components already in the desired state: this costs a few stat calls, no D-Bus. A component
+    # waiting for one applied in this switch is applied too, as that one may overwrite it (e.g. the Global
+    # Theme and the GTK theme): dependencies come first in COMPONENTS, so one pass is enough
+    with tracing.span("state cache check"):
+        state_cache = get_state_cache()
+        stale = {}
+        for component in COMPONENTS:
+            value = requested[component.name]
+            if value and (
+                component.files() is None
+                or any(dep in stale for dep in component.depends)
+                or not state_cache.is_current(component.name, states[component.name], component.files())
+            ):
+                stale[component.name] = value
+    skipped = {name: ("skipped", None) for name, value in requested.items() if value and name not in stale}
+    logger.debug("[setup] Already applied: %s", list(skipped))
+
+    if not stale:
+        # Next notification is disabled as can be too distracting, especially if cron launches the script quite often
+        # (and a no-op run should not even connect to the session bus)
+        # get_notifications().add("info", "There is nothig to do, exiting...")
+        logger.info("There is nothig to do, exiting...")
+        get_notifications().flush()
+        return skipped
+
+    from bus_manager import session_bus, CallTimeout
+
+    session_bus.call_timeout = dbus_call_timeout
+    session_bus.breaker = get_circuit_breaker()
+
+    # Each component checks that its theme exists right before applying it: the checks run concurrently
+    # and overlap with the components that do not depend on them
+    invalid = set()
+
+    def check_and_apply(name: str, value: str):
+        # Raises CallTimeout once the deadline of the switch has passed
+        session_bus.remaining()
+        if validate:
+            try:
+                COMPONENTS[name].check(value)
+            except RuntimeError:
+                invalid.add(name)
+                raise
+        return COMPONENTS[name].apply(value)
+
+    components = {
+        name: (lambda name=name, value=value: check_and_apply(name, value))
+        for name, value in stale.items()
+    }
+
+    global _overridden
+    _overridden = overridden
+    try:
+        with session_bus.deadline(switch_timeout):
+            results = apply_components(components)
+    finally:
+        _overridden = {}
+    for name in components:
+        component = COMPONENTS[name]
+        result, exception = results[name]
+        if exception is None and result is not False:
+            if component.files() is not None:
+                state_cache.record(name, states[name], component.files())
+            continue
+        # Whatever has been partially applied, make sure it is applied again next time
+        state_cache.forget(name)
+        if exception is None and component.partial_message is not None:
+            # e.g. the Global Theme is applied, only 'kdeglobals' could not be updated
+            logger.error(component.partial_message)
+            get_notifications().add("warning", component.partial_message)
+            continue
+        if isinstance(exception, CallTimeout):
+            # Not an error of the theme: whatever hangs is given time to recover, see get_circuit_breaker()
+            logger.warning("[%s] %s", name, exception)
+            get_notifications().add("warning", f"Timed out when applying {name}, it will be applied again next time", "Timeout")
+            continue
+        message = "One of the items specified as argument cannot be found in system!" if name in invalid else component.failure_message
+        if name in invalid:
+            logger.error("%s %s", message, exception)
+        else:
+            logger.error(message)
+        get_notifications().add("critical", message)
+    state_cache.save()
+    # A single notification for the whole run
+    get_notifications().flush()
+    if any(results[name][1] is not None or results[name][0] is False for name in components):
+        dump_debug_log()
+
+    results.update(skipped)
+    return results
+
+def apply_profile(name: str) -> dict:
+    """Applies a named profile of the configuration file, see get_profiles().
+
+    The profile is validated only when it, or one of the resources it refers to, changed since the
+    last time it was validated. The components whose theme cannot be found are not applied, and are
+    reported as failed in the results.
+
+    Args:
+        name (str): The name of the profile, "toggle" for the one applied before the current one.
+
+    Raises:
+        RuntimeError: If the profile does not exist or nothing can be toggled.
+
+    Returns:
+        dict: The results of switch_theme().
+    """
+    profiles = get_profiles()
+    if name == "toggle":
+        name = profiles.toggle()
+    themes, invalid = profiles.get(name)
+    logger.debug("[setup] Profile %s: %s", name, themes)
+    for argument, error in invalid.items():
+        logger.error("One of the items of profile \"%s\" cannot be found in system, skipping %s: %s", name, argument, error)
+    if invalid:
+        get_notifications().add("critical", f"One of the items of profile \"{name}\" cannot be found in system!")
+    results = switch_theme(**themes, validate=False)
+    for component in COMPONENTS:
+        if component.argument in invalid:
+            results[component.name] = (None, RuntimeError(invalid[component.argument]))
+    profiles.applied(name)
+    return results
+
+def results_reply(results: dict, error: str = "") -> dict:
+    """Summarizes the results of switch_theme() for the daemon's clients and --json.
+
+    Args:
+        results (dict): The results of switch_theme().
+        error (str, optional): Why nothing could be applied at all. Defaults to "".
+
+    Returns:
+        dict: {"ok": bool, "error": str, "components": {name: error or None}, "timed_out": [name]}.
+    """
+    from circuit_breaker import CallTimeout
+
+    components = {
+        name: None if exception is None and result is not False else str(exception or "failed")
+        for name, (result, exception) in results.items()
+    }
+    timed_out = [name for name, (_, exception) in results.items() if isinstance(exception, CallTimeout)]
+    failed = [name for name, component_error in components.items() if component_error is not None]
+    if failed and not error:
+        error = f"Unable to apply: {', '.join(failed)}"
+    return {"ok": not error, "error": error, "components": components, "timed_out": timed_out}
+
+def session_users() -> list:
+    """Returns the users logged in with a session bus (i.e. having a /run/user/UID/bus socket).
+
+    Returns:
+        list: Their pwd.struct_passwd entries, sorted by UID.
+    """
+    import glob
+
+    users = []
+    for bus in glob.glob("/run/user/*/bus"):
+        uid = os.path.basename(os.path.dirname(bus))
+        if not uid.isdigit():
+            continue
+        try:
+            users.append(pwd.getpwuid(int(uid)))
+        except KeyError:
+            continue
+    return sorted(users, key=lambda entry: entry.pw_uid)
+
+def session_environment(entry, env: dict, identity: dict) -> dict:
+    """Reads the display variables of a user's graphical session from their systemd user manager.
+
+    Args:
+        entry (pwd.struct_passwd): The user.
+        env (dict): The environment to run 'systemctl' with (XDG_RUNTIME_DIR, DBUS_SESSION_BUS_ADDRESS).
+        identity (dict): The user and groups to run 'systemctl' as, see subprocess.run().
+
+    Returns:
+        dict: The variables of session_variables the session defines, empty if they cannot be read.
+    """
+    try:
+        completed = subprocess.run(
+            args=["systemctl", "--user", "show-environment"],
+            env=env,
+            capture_output=True,
+            text=True,
+            timeout=dbus_call_timeout,
+            **identity,
+        )
+    except (subprocess.TimeoutExpired, OSError) as e:
+        logger.debug("[fleet] Unable to read the session environment of %s: %s", entry.pw_name, e)
+        return {}
+    if completed.returncode != 0:
+        logger.debug("[fleet] Unable to read the session environment of %s: %s", entry.pw_name, completed.stderr.strip())
+        return {}
+    variables = dict(line.partition("=")[::2] for line in completed.stdout.splitlines() if "=" in line)
+    return {name: variables[name] for name in session_variables if variables.get(name)}
+
+def switch_user(entry, argv: list) -> dict:
+    """Runs LightHouse for another user, in their session, with their home and their session bus.
+
+    Args:
+        entry (pwd.struct_passwd): The user.
+        argv (list): The LightHouse options (or the profile name) to apply.
+
+    Returns:
+        dict: The reply of the user's LightHouse, see results_reply().
+    """
+    import json
+
+    runtime_dir = f"/run/user/{entry.pw_uid}"
+    env = {
+        "HOME": entry.pw_dir,
+        "USER": entry.pw_name,
+        "LOGNAME": entry.pw_name,
+        "PATH": os.environ.get("PATH", "/usr/local/bin:/usr/bin:/bin"),
+        "XDG_RUNTIME_DIR": runtime_dir,
+        "DBUS_SESSION_BUS_ADDRESS": f"unix:path={runtime_dir}/bus",
+    }
+    # Dropping privileges needs root, running as ourselves does not
+    identity = {} if entry.pw_uid == os.getuid() else {"user": entry.pw_uid, "group": entry.pw_gid, "extra_groups": []}
+    # The tools LightHouse runs (lookandfeeltool, the Plasma tools) need the user's display
+    env.update(session_environment(entry, env, identity))
+    try:
+        completed = subprocess.run(
+            args=[sys.executable, os.path.abspath(__file__), "--json", *argv],
+            env=env,
+            cwd=entry.pw_dir,
+            capture_output=True,
+            text=True,
+            timeout=fleet_timeout,
+            **identity,
+        )
+    except subprocess.TimeoutExpired:
+        return {"ok": False, "error": f"Timed out after {fleet_timeout}s", "components": {}}
+    except OSError as e:
+        return {"ok": False, "error": f"Cannot run LightHouse: {e}", "components": {}}
 
-    """    
     try:
-        subprocess.run(args=["plasmashell", "--replace > ", "/dev/null", "2>&1", "&&", "sleep 5 &"], text=True)
-    except subprocess.CalledProcessError: raise
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        stderr = completed.stderr.strip().splitlines()
+        return {"ok": False, "error": f"Exited with status {completed.returncode}: {stderr[-1] if stderr else 'no output'}", "components": {}}
+
+def run_fleet(argv: list) -> bool:
+    """Applies the same themes to every user logged in on this host, see session_users().
+
+    Each user gets their own LightHouse process (their paths, their session bus), at most
+    fleet_max_workers at once. A per-user report is printed at the end.
+
+    Args:
+        argv (list): The LightHouse options (or the profile name) to apply.
+
+    Returns:
+        bool: True if every user has been switched successfully.
+    """
+    from concurrent import futures
+
+    users = session_users()
+    logger.info("[fleet] Switching %s users", len(users))
+    with futures.ThreadPoolExecutor(max_workers=max(min(len(users), fleet_max_workers), 1)) as executor:
+        replies = dict(zip((entry.pw_name for entry in users), executor.map(lambda entry: switch_user(entry, argv), users)))
+
+    print("--- LightHouse fleet report ---")
+    for entry in users:
+        reply = replies[entry.pw_name]
+        if reply["ok"]:
+            print(f"\t{entry.pw_name} ({entry.pw_uid}):\tok")
+            continue
+        failures = "; ".join(f"{name}: {error}" for name, error in reply["components"].items() if error is not None)
+        print(f"\t{entry.pw_name} ({entry.pw_uid}):\tFAILED\t{failures or reply['error']}")
+    failed = sum(not reply["ok"] for reply in replies.values())
+    print(f"\t{len(users)} users, {len(users) - failed} ok, {failed} failed")
+    print("--- LightHouse fleet report ---")
+    return failed == 0
+
+def run_watch(themes: dict) -> None:
+    """Keeps the given themes applied: re-applies a component as soon as another tool changes its setting.
+
+    The files of the components that can read their setting back (kdeglobals, konsolerc, settings.json)
+    are watched with inotify (no polling). When one of them is rewritten, e.g. by System Settings or
+    VSCode's settings sync, only that file is parsed, and only its component is applied again, if its
+    setting actually drifted.
+
+    Themes that cannot be found are not watched, as they could never be applied.
+
+    Args:
+        themes (dict): The keyword arguments of switch_theme(), already applied.
+
+    Raises:
+        RuntimeError: If none of the themes can be watched, or inotify is not available.
+    """
+    from watcher import FileWatcher
+
+    invalid = invalid_args(themes)
+    for argument, error in invalid.items():
+        logger.warning("[watch] Not watching %s: %s", argument, error)
+    watchable = [component for component in COMPONENTS if component.can_read]
+    watched = {
+        component.files()[0]: component
+        for component in watchable
+        if themes.get(component.argument) and component.argument not in invalid
+    }
+    if not watched:
+        raise RuntimeError(f"Nothing to watch: only these components can be watched: {', '.join(c.name for c in watchable)}")
+    try:
+        watcher = FileWatcher(list(watched))
+    except OSError as e:
+        raise RuntimeError(f"Unable to watch the configuration files: {e}")
+
+    logger.info("[watch] Watching %s", ", ".join(watched))
+    try:
+        while True:
+            for path in watcher.wait():
+                component = watched[path]
+                expected = themes[component.argument]
+                try:
+                    current = component.read()
+                except (OSError, ValueError) as e:
+                    logger.warning("[watch] Unable to read %s: %s", path, e)
+                    current = None
+                if current == expected:
+                    continue
+                logger.info("[watch] %s drifted to %s, applying %s again", component.name, current, expected)
+                switch_theme(**{component.argument: expected}, validate=False)
+    finally:
+        watcher.close()
+
+def run_scheduler() -> None:
+    """Switches between the "day" and "night" themes at sunrise and sunset, without cron.
+
+    Sunrise and sunset are computed offline from the coordinates in the "schedule" section of the
+    configuration file (see load_settings()). The scheduler applies the theme of the current phase,
+    then sleeps until the next transition and applies exactly once per transition: there are no
+    periodic wakeups in between. Suspend/resume and system clock changes are taken into account.
+
+    Raises:
+        RuntimeError: If the "schedule" section is missing or incomplete.
+    """
+    import datetime
+    import scheduler
+
+    schedule = load_settings().get("schedule")
+    try:
+        latitude = float(schedule["latitude"])
+        longitude = float(schedule["longitude"])
+        offsets = (float(schedule.get("sunrise_offset", 0)), float(schedule.get("sunset_offset", 0)))
+        # Either the name of a profile or a list of LightHouse options
+        phase_themes = {
+            phase: schedule[phase] if isinstance(schedule[phase], str)
+                else COMPONENTS.themes_from_options(getopt.getopt(schedule[phase], *option_table())[0])
+            for phase in ("day", "night")
+        }
+    except (TypeError, KeyError, ValueError, getopt.error) as e:
+        raise RuntimeError(f"Invalid \"schedule\" section in {settings_file}: {e}")
+
+    # Do not repeat the same error at every transition
+    get_notifications().rate_limit = scheduled_notification_interval
+
+    applied_phase = None
+    while True:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        phase = scheduler.current_phase(now, latitude, longitude, *offsets)
+        if phase != applied_phase:
+            logger.info("[scheduler] Applying the %s theme", phase)
+            if isinstance(phase_themes[phase], str):
+                apply_profile(phase_themes[phase])
+            else:
+                switch_theme(**phase_themes[phase])
+            applied_phase = phase
+
+        transition = scheduler.next_transition(now, latitude, longitude, *offsets)
+        if transition is None:
+            # Polar day or night lasting more than a year (i.e. at the poles), nothing else to do
+            logger.info("[scheduler] No sunrise nor sunset ahead, exiting...")
+            return
+        when, next_phase = transition
+        logger.info("[scheduler] Next switch to the %s theme at %s", next_phase, when.astimezone().strftime("%Y-%m-%d %H:%M"))
+        # Whether the time has been reached or the clock changed, the phase is computed again
+        scheduler.sleep_until(when.timestamp())
+
+def follow_konsole() -> None:
+    """Applies the current Konsole profile (see konsolerc) to every new Konsole instance, see konsole_listener.
+
+    Runs until the process exits, only logs a warning if PyGObject is not installed.
+    """
+    from konsole_listener import KonsoleListener
+
+    try:
+        KonsoleListener(read_konsole_profile).run()
+    except RuntimeError as e:
+        logger.warning("[konsole] %s", e)
+
+def run_daemon() -> None:
+    """Runs LightHouse as a resident daemon, serving the requests of lighthouse_client.py.
+
+    The bus connection and the caches (theme index, profiles, state) stay warm between requests, so a switch
+    costs a single round trip on a Unix socket instead of a cold start. Two methods are exposed:
+    "apply" takes the usual LightHouse options, "toggle" re-applies the themes applied before the
+    current ones. "apply" also takes the name of a profile (see get_profiles()). Requests are served
+    one at a time. New Konsole windows get the current profile as they appear (see follow_konsole()).
+    """
+    import json
+    import signal
+    import threading
+    import socketserver
+    from bus_manager import session_bus
+    from lighthouse_client import socket_path
+
+    # Warm up the connection used at every switch
+    session_bus.bus
+    if get_wallpaper_cache() is not None:
+        # Fill the wallpaper cache in the background, switches use whatever is ready
+        threading.Thread(target=prerender_wallpapers, name="prerender", daemon=True).start()
+    # Give the current Konsole profile to the Konsole windows opened from now on
+    threading.Thread(target=follow_konsole, name="konsole", daemon=True).start()
+
+    lock = threading.Lock()
+    # The last two different sets of themes applied, the current one last
+    history = []
+
+    def apply(themes: dict = None, profile: str = None) -> dict:
+        with lock:
+            if profile is not None:
+                # Profiles are validated by the profile cache
+                themes = get_profiles().get(profile)[0]
+                results = apply_profile(profile)
+            else:
+                # Validated at every request (a few stat calls): a theme may have been removed since
+                results = switch_theme(**themes)
+            if not history or history[-1] != themes:
+                history.append(themes)
+                del history[:-2]
+        return results_reply(results)
+
+    class RequestHandler(socketserver.StreamRequestHandler):
+        def handle(self) -> None:
+            try:
+                request = json.loads(self.rfile.readline())
+                logger.debug("[daemon] Request: %s", request)
+                themes, profile = None, None
+                if request["method"] == "apply":
+                    args, vals = getopt.getopt(request["argv"], *option_table())
+                    if vals:
+                        profile = get_profiles().toggle() if vals[0] == "toggle" else vals[0]
+                    else:
+                        themes = COMPONENTS.themes_from_options(args)
+                elif request["method"] == "toggle":
+                    if len(history) >= 2:
+                        themes = history[-2]
+                    else:
+                        # Nothing applied since the daemon started, go back to the previous profile
+                        profile = get_profiles().toggle()
+                else:
+                    raise RuntimeError(f"Unknown method: {request['method']}")
+                reply = apply(themes, profile)
+            except (ValueError, KeyError, getopt.error, RuntimeError) as e:
+                logger.error("[daemon] Request failed: %s", e)
+                reply = {"ok": False, "error": str(e), "components": {}}
+            self.wfile.write(json.dumps(reply).encode() + b"\n")
+
+    path = socket_path()
+    if os.path.exists(path):
+        os.unlink(path)
+    # The socket must be reachable by the current user only
+    os.umask(0o077)
+    # Remove the socket when stopped by systemd or kill
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit())
+    with socketserver.ThreadingUnixStreamServer(path, RequestHandler) as server:
+        logger.info("LightHouse daemon listening on %s", path)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(path)
+
 
 
 #   __  __          _____ _   _ 
@@ -424,249 +1559,114 @@ def rstPlasmashell() -> None:
 
 
 if __name__ == '__main__':
+    mark_startup("import")
 
-    plasma_theme : str = ""
-    gtk_theme : str = ""
-    wallpaper : str = ""
-    konsole_profile : str = ""
-    vscode_theme : str = ""
-
-    logger.handlers[0].setLevel(logging.INFO)
-
-    short_opts : str = "hp:g:w:k:f:c:v"
-    long_opts : list = ["help", "plasma=", "gtk=", "wallpaper=", "konsole=", "vscode=", "verbose"]
     arg_list : list = sys.argv[1:]
 
     try:
-        args, vals = getopt.getopt(arg_list, short_opts, long_opts);
+        args, vals = getopt.getopt(arg_list, *option_table());
     except getopt.error:
-        logger.error(f"Cannot start LightHouse! Error while specifying arguments, see wiki or --help")
-        notifier.Notify(
-            app_name,
-            replaces_id,
-            critical_app_icon,
-            "ERROR",
-            "Cannot start LightHouse! Error while specifying arguments, see wiki or --help",
-            actions,
-            {"urgency" : 3},
-            expire_timeout,
-        )
-        print("--- LightHouse Help Page ---")
-        print("")
-        print("\t-h,\t--help:\t\t\t\t\tOpen this help page")
-        print("\t-p=,\t--plasma = PLASMA_GLOBAL_THEME:\t\tApply Plasma Global Theme")
-        print("\t-g=,\t--gtk = GTK_THEME:\t\t\tApply gtk_theme")
-        print("\t-w=,\t--wallpaper = WALLPAPER:\t\tApply Wallpaper (indicate /path/to/file)")
-        print("\t-k=,\t--konsole = KONSOLE_PROFILE:\t\tApply Konsole Profile")
-        print("\t-c=,\t--vscode = VSCODE_THEME:\t\tApply VSCode Theme")
-        print("\t-v=,\t--verbose:\t\tVerbose mode: enable DEBUG logging")
-        print("")
-        print("--- LightHouse Help Page ---")
+        setup_logging(verbose=False)
+        logger.error("Cannot start LightHouse! Error while specifying arguments, see wiki or --help")
+        get_notifications().notify("critical", "Cannot start LightHouse! Error while specifying arguments, see wiki or --help")
+        print_help()
         sys.exit()
 
+    mark_startup("arguments")
+    setup_logging(verbose=any(curr_arg in ("-v", "--verbose") for curr_arg, _ in args))
+
+    # Print the results as JSON on stdout (--json), see results_reply()
+    json_report = False
+    # Keep the themes applied afterwards (--watch), see run_watch()
+    watch = False
+
     # Evaluate the given options
     for curr_arg, curr_val in args:
         if curr_arg in ("-h", "--help"):
             logger.info("Visit https://bit.ly/32UK20A or launch the script from terminal for full help/man page")
-            notifier.Notify(
-                app_name,
-                replaces_id,
-                info_app_icon,
-                "Help page",
-                "Visit https://bit.ly/32UK20A or launch the script from terminal for full help/man page",
-                actions,
-                {"urgency" : 0},
-                expire_timeout,
-            )
-
-            print("--- LightHouse Help Page ---")
-            print("")
-            print("\t-h,\t--help:\t\t\t\t\tOpen this help page")
-            print("\t-p,\t--plasma = PLASMA_GLOBAL_THEME:\t\tApply Plasma Global Theme")
-            print("\t-g,\t--gtk = GTK_THEME:\t\t\tApply gtk_theme")
-            print("\t-w=,\t--wallpaper = WALLPAPER:\t\tApply Wallpaper (indicate /path/to/file)")
-            print("\t-k,\t--konsole = KONSOLE_PROFILE:\t\tApply Konsole Profile")
-            print("\t-c=,\t--vscode = VSCODE_THEME:\t\tApply VSCode Theme")
-            print("\t-v=,\t--verbose:\t\tVerbose mode: enable DEBUG logging")
-            print("")
-            print("--- LightHouse Help Page ---")
+            get_notifications().notify("info", "Visit https://bit.ly/32UK20A or launch the script from terminal for full help/man page", summary="Help page")
+
+            print_help()
             sys.exit()
-        elif curr_arg in ("-p", "--plasma"):
-            plasma_theme = curr_val
-        elif curr_arg in ("-g", "--gtk"):
-            gtk_theme = curr_val
-        elif curr_arg in ("-w", "--wallpaper"):
-            wallpaper = curr_val
-        elif curr_arg in ("-k", "--konsole"):
-            konsole_profile = curr_val
-        elif curr_arg in ("-c", "--vscode"):
-            vscode_theme = curr_val
         elif curr_arg in ("-v", "--verbose"):
-            logger.handlers[0].setLevel(logging.DEBUG)
+            # Already taken into account by setup_logging()
+            pass
+        elif curr_arg == "--startup-time":
+            atexit.register(report_startup_times)
+        elif curr_arg == "--timings":
+            tracing.enable()
+            atexit.register(lambda: print(tracing.summary(), file=sys.stderr))
+        elif curr_arg == "--trace":
+            tracing.enable()
+            atexit.register(tracing.write_chrome_trace, curr_val)
+        elif curr_arg == "--daemon":
+            run_daemon()
+            sys.exit()
+        elif curr_arg == "--json":
+            json_report = True
+        elif curr_arg == "--watch":
+            watch = True
+        elif curr_arg == "--fleet":
+            sys.exit(0 if run_fleet([arg for arg in arg_list if arg != "--fleet"]) else 1)
+        elif curr_arg == "--prerender-wallpapers":
+            try:
+                logger.info("Pre-rendered %s wallpapers", prerender_wallpapers())
+            except RuntimeError as e:
+                logger.error(e)
+            sys.exit()
+        elif curr_arg == "--schedule":
+            try:
+                run_scheduler()
+            except RuntimeError as e:
+                logger.error(e)
+                get_notifications().notify("critical", str(e))
+            except KeyboardInterrupt:
+                pass
+            sys.exit()
         else:
             pass
 
-    logger.debug(f"[setup] Plasma_theme: {plasma_theme}")
-    logger.debug(f"[setup] gtk_theme: {gtk_theme}")
-    logger.debug(f"[setup] wallpaper: {wallpaper}")
-    logger.debug(f"[setup] konsole_profile: {konsole_profile}")
-    logger.debug(f"[setup] vscode_theme: {vscode_theme}")
+    themes = COMPONENTS.themes_from_options(args)
+    for argument, value in themes.items():
+        logger.debug("[setup] %s: %s", argument, value)
 
-    if len(args) == 0:
-        logger.error("Cannot start LightHouse! Error while specifying arguments, see wiki or --help")
-        notifier.Notify(
-                app_name,
-                replaces_id,
-                warning_app_icon,
-                "Warning",
-                "Cannot start LightHouse! Error while specifying arguments, see wiki or --help",
-                actions,
-                {"urgency" : 1},
-                expire_timeout,
-            )
-
-        print("--- LightHouse Help Page ---")
-        print("")
-        print("\t-h,\t--help:\t\t\t\t\tOpen this help page")
-        print("\t-p=,\t--plasma = PLASMA_GLOBAL_THEME:\t\tApply Plasma Global Theme")
-        print("\t-g=,\t--gtk = GTK_THEME:\t\t\tApply gtk_theme")
-        print("\t-w=,\t--wallpaper = WALLPAPER:\t\tApply Wallpaper (indicate /path/to/file)")
-        print("\t-k=,\t--konsole = KONSOLE_PROFILE:\t\tApply Konsole Profile")
-        print("\t-c=,\t--vscode = VSCODE_THEME:\t\tApply VSCode Theme")
-        print("\t-v=,\t--verbose:\t\tVerbose mode: enable DEBUG logging")
-        print("")
-        print("--- LightHouse Help Page ---")
-        print("")
+    if vals:
+        # A named profile (or "toggle") instead of the options
+        try:
+            name = get_profiles().toggle() if vals[0] == "toggle" else vals[0]
+            reply = results_reply(apply_profile(name))
+            if json_report:
+                import json
+                print(json.dumps(reply), flush=True)
+            if watch:
+                run_watch(get_profiles().get(name)[0])
+        except KeyboardInterrupt:
+            pass
+        except RuntimeError as e:
+            logger.error(e)
+            get_notifications().notify("critical", str(e))
+            if json_report:
+                import json
+                print(json.dumps(results_reply({}, str(e))))
         sys.exit()
 
-    # Check if the specified themes exist in system
-    try:
-        check_args(plasma_theme, gtk_theme, wallpaper, konsole_profile)
-    except:
-        logger.error("One of the items specified as argument cannot be found in system!")
-        notifier.Notify(
-            app_name,
-            replaces_id,
-            critical_app_icon,
-            "ERROR",
-            "One of the items specified as argument cannot be found in system!",
-            actions,
-            {"urgency" : 2},
-            expire_timeout,
-        )
+    if len(args) == 0:
+        logger.error("Cannot start LightHouse! Error while specifying arguments, see wiki or --help")
+        get_notifications().notify("warning", "Cannot start LightHouse! Error while specifying arguments, see wiki or --help")
 
-    if (plasma_theme and check_config_files(config_path, "kdeglobals", "LookAndFeelPackage=", plasma_theme)):
-        # Next notification is disabled as can be too distracting, especially if cron launches the script quite often
-        notifier.Notify(
-            app_name,
-            replaces_id,
-            info_app_icon,
-            "Info",
-            "There is nothig to do, exiting...",
-            actions,
-            {"urgency" : 0},
-            expire_timeout,
-        )
-        logger.info("There is nothig to do, exiting...")
+        print_help()
         sys.exit()
-    else:
-        if plasma_theme:
-            try:
-                if set_plasma_global_theme(plasma_theme) is False:
-                    logger.error("")
-                    notifier.Notify(
-                        app_name,
-                        replaces_id,
-                        warning_app_icon,
-                        "Warning",
-                        "Plasma's Global Theme applied, but configuration not updated!",
-                        actions,
-                        {"urgency" : 1},
-                        expire_timeout,
-                    )
-            except:
-                logger.error("Error when applying Plasma's Global Theme, is 'lookandfeeltool' installed?")
-                notifier.Notify(
-                    app_name,
-                    replaces_id,
-                    critical_app_icon,
-                    "ERROR",
-                    "Error when applying Plasma's Global Theme, is 'lookandfeeltool' installed?",
-                    actions,
-                    {"urgency" : 2},
-                    expire_timeout,
-                )
-        if gtk_theme:
-            try:
-                set_gtk_theme(gtk_theme)
-            except:
-                logger.error("Error when applying GTK theme...")
-                notifier.Notify(
-                    app_name,
-                    replaces_id,
-                    critical_app_icon,
-                    "ERROR",
-                    "Error when applying GTK theme...",
-                    actions,
-                    {"urgency" : 2},
-                    expire_timeout,
-                )
-        if wallpaper:
-            try:
-                set_wallpaper(wallpaper)
-            except:
-                logger.error("Error when applying wallpaper...")
-                notifier.Notify(
-                    app_name,
-                    replaces_id,
-                    critical_app_icon,
-                    "ERROR",
-                    "Error when applying wallpaper...",
-                    actions,
-                    {"urgency" : 2},
-                    expire_timeout,
-                )
-        if konsole_profile:
-            try:
-                set_konsole(konsole_profile)
-            except:
-                logger.error("Error when applying Konsole Profile...")
-                notifier.Notify(
-                    app_name,
-                    replaces_id,
-                    critical_app_icon,
-                    "ERROR",
-                    "Error when applying Konsole Profile...",
-                    actions,
-                    {"urgency" : 2},
-                    expire_timeout,
-                )
-        if vscode_theme:
-            if set_vscode(vscode_theme) is False:
-                logger.error("Unable to set VSCode theme or PDF preview...")
-                notifier.Notify(
-                    app_name,
-                    replaces_id,
-                    critical_app_icon,
-                    "ERROR",
-                    "Unable to set VSCode theme or PDF preview...",
-                    actions,
-                    {"urgency" : 2},
-                    expire_timeout,
-                )
 
-        # Some issues may disappear by forcing a plasmashell restart
-        # try:
-        #     rstPlasmashell()
-        # except:
-        #     logger.error("Unable to restart 'plasmashell'")
-        #     notifier.Notify(
-        #         app_name,
-        #         replaces_id,
-        #         app_icon,
-        #         "ERROR",
-        #         "Unable to restart 'plasmashell'",
-        #         actions,
-        #         {"urgency" : 2},
-        #         expire_timeout,
-        #     )
\ No newline at end of file
+    results = switch_theme(**themes)
+    if json_report:
+        import json
+        print(json.dumps(results_reply(results)), flush=True)
+
+    if watch:
+        try:
+            run_watch(themes)
+        except RuntimeError as e:
+            logger.error(e)
+            get_notifications().notify("critical", str(e))
+        except KeyboardInterrupt:
+            pass
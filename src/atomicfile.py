@@ -0,0 +1,40 @@
+import os
+import tempfile
+
+
+def write_atomically(
+        path: str,
+        content,
+        mode: int = None,
+    ) -> None:
+    """Replaces the content of a file atomically: readers see either the old or the new content, never a mix.
+
+    The content is written to a temporary file in the same directory, flushed to disk, then renamed
+    over the target. If the target is a symlink (e.g. dotfile managers), its destination is replaced.
+
+    Args:
+        path (str): The path of the file.
+        content (str or bytes): The new content of the file, written in binary mode if given as bytes.
+        mode (int, optional): The permissions of the file. Defaults to the ones of the current file, or 0o600.
+
+    Raises:
+        OSError: If the file cannot be written.
+    """
+    path = os.path.realpath(path)
+    if mode is None:
+        try:
+            mode = os.stat(path).st_mode & 0o7777
+        except FileNotFoundError:
+            mode = 0o600
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix="." + os.path.basename(path) + ".")
+    try:
+        with os.fdopen(fd, "wb" if isinstance(content, bytes) else "w") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
@@ -0,0 +1,328 @@
+import time
+import logging
+import threading
+import contextlib
+
+# Requires dbus-python installed (possibly from distro's package manager)
+import dbus
+import dbus.lowlevel
+
+import tracing
+from circuit_breaker import CallTimeout
+
+logger = logging.getLogger("LightHouse")
+
+# Errors meaning that a call got no reply in time
+TIMEOUT_ERRORS = (
+    "org.freedesktop.DBus.Error.NoReply",
+    "org.freedesktop.DBus.Error.Timeout",
+    "org.freedesktop.DBus.Error.TimedOut",
+)
+
+# How often the owner of a bus name is checked when PyGObject is not available, see wait_for_new_owner()
+OWNER_POLL_INTERVAL = 0.05
+
+# The default timeout of a method call, in seconds (dbus-python's own is about 25s)
+DEFAULT_CALL_TIMEOUT = 5
+
+
+class SessionBusManager:
+    """Holds a single session bus connection, shared by every call of a run.
+
+    Methods are called on the bus names directly, with no proxies (see call()): a restarted service
+    (e.g. plasmashell) is reached through its well-known name, with nothing to invalidate.
+
+    Method calls are bounded by call_timeout and by the deadline of the switch in progress, if any (see
+    deadline()). With a breaker set, the services that timed out recently are not called at all.
+    """
+
+    def __init__(self) -> None:
+        self._bus = None
+        self._lock = threading.Lock()
+        self._deadline = None
+        self.call_timeout = DEFAULT_CALL_TIMEOUT
+        # A circuit_breaker.CircuitBreaker, None to always call every service
+        self.breaker = None
+
+    @property
+    def bus(self) -> dbus.bus.BusConnection:
+        """The session bus connection, opened on first use."""
+        with self._lock:
+            if self._bus is None:
+                self._bus = dbus.SessionBus()
+            return self._bus
+
+    @contextlib.contextmanager
+    def deadline(self, timeout: float):
+        """Bounds every call made in the block (from any thread) by an overall deadline.
+
+        Args:
+            timeout (float): The time left to the block, in seconds.
+        """
+        self._deadline = time.monotonic() + timeout
+        try:
+            yield
+        finally:
+            self._deadline = None
+
+    def remaining(self, timeout: float = None) -> float:
+        """Returns how long the next call may take: its own timeout, cut down to the deadline if any.
+
+        Args:
+            timeout (float, optional): The timeout of the call, in seconds. Defaults to call_timeout.
+
+        Raises:
+            CallTimeout: If the deadline has passed already.
+
+        Returns:
+            float: The time left, in seconds.
+        """
+        timeout = self.call_timeout if timeout is None else timeout
+        if self._deadline is not None:
+            left = self._deadline - time.monotonic()
+            if left <= 0:
+                raise CallTimeout("Timed out: the deadline of the switch has passed")
+            timeout = min(timeout, left)
+        return timeout
+
+    def _check_breaker(self, bus_name: str) -> None:
+        if self.breaker is not None:
+            cooldown = self.breaker.open_for(bus_name)
+            if cooldown > 0:
+                raise CallTimeout(f"Timed out: {bus_name} timed out recently, skipped for another {cooldown:.0f}s")
+
+    def _timed_out(self, bus_name: str, error) -> bool:
+        if error.get_dbus_name() not in TIMEOUT_ERRORS:
+            return False
+        if self.breaker is not None:
+            self.breaker.failed(bus_name)
+        return True
+
+    def call(
+            self,
+            bus_name: str,
+            object_path: str,
+            interface: str,
+            method: str,
+            *args,
+            signature: str = None,
+            timeout: float = None,
+        ):
+        """Calls a method, waiting at most timeout seconds (and never past the deadline) for the reply.
+
+        The message is sent to the bus name directly, with no proxy: a proxy introspects its object first,
+        a round trip that could not be bounded (and that a hung service would never answer).
+
+        Args:
+            bus_name (str): The bus name owning the object.
+            object_path (str): The path of the object.
+            interface (str): The D-Bus interface the method belongs to.
+            method (str): The name of the method.
+            *args: The arguments of the method.
+            signature (str, optional): The D-Bus signature of the arguments. Defaults to guessing it from
+                their Python types.
+            timeout (float, optional): The timeout of the call, in seconds. Defaults to call_timeout.
+
+        Raises:
+            CallTimeout: If the call times out, or the service is skipped after timing out recently.
+            dbus.exceptions.DBusException: If the call fails.
+
+        Returns:
+            The value returned by the method.
+        """
+        with tracing.span(f"dbus {interface}.{method}", bus_name=bus_name, object_path=object_path):
+            self._check_breaker(bus_name)
+            timeout = self.remaining(timeout)
+            try:
+                reply = self.bus.call_blocking(bus_name, object_path, interface, method, signature, args, timeout=timeout)
+            except dbus.exceptions.DBusException as e:
+                if self._timed_out(bus_name, e):
+                    raise CallTimeout(f"Timed out: no reply from {bus_name} to {method} within {timeout:.1f}s")
+                raise
+            if self.breaker is not None:
+                self.breaker.succeeded(bus_name)
+            return reply
+
+    def list_names(self) -> list:
+        """Returns the names currently registered on the bus.
+
+        Returns:
+            list: The bus names, as str.
+        """
+        with tracing.span("dbus org.freedesktop.DBus.ListNames"):
+            return [str(name) for name in self.bus.list_names()]
+
+    def emit_signal(
+            self,
+            object_path: str,
+            interface: str,
+            signal: str,
+            signature: str,
+            *args,
+        ) -> None:
+        """Broadcasts a signal on the bus, e.g. to tell KDE applications to reload a setting.
+
+        Args:
+            object_path (str): The path of the object emitting the signal, e.g. "/KGlobalSettings".
+            interface (str): The interface of the signal, e.g. "org.kde.KGlobalSettings".
+            signal (str): The name of the signal, e.g. "notifyChange".
+            signature (str): The D-Bus signature of the arguments, e.g. "ii".
+            *args: The arguments of the signal.
+        """
+        with tracing.span(f"dbus {interface}.{signal}", object_path=object_path):
+            message = dbus.lowlevel.SignalMessage(object_path, interface, signal)
+            if args:
+                message.append(*args, signature=signature)
+            self.bus.send_message(message)
+
+    def name_owner(self, bus_name: str) -> str:
+        """Returns the unique name of the owner of a bus name.
+
+        Args:
+            bus_name (str): The bus name, e.g. "org.kde.plasmashell".
+
+        Returns:
+            str: The unique name of the owner, e.g. ":1.42", None if the name has no owner.
+        """
+        try:
+            return str(self.bus.get_name_owner(bus_name))
+        except dbus.exceptions.DBusException:
+            return None
+
+    def wait_for_new_owner(
+            self,
+            bus_name: str,
+            start,
+            timeout: float,
+        ) -> bool:
+        """Starts something (e.g. a process) and waits until it owns the given bus name.
+
+        The wait is driven by NameOwnerChanged on a GLib main context private to the calling thread, so it
+        ends as soon as the name is taken. Without PyGObject, the owner is polled every OWNER_POLL_INTERVAL.
+
+        Args:
+            bus_name (str): The bus name, e.g. "org.kde.plasmashell".
+            start (callable): Starts what will own the name, called once the wait is set up.
+            timeout (float): The maximum time to wait, in seconds.
+
+        Returns:
+            bool: True if the name got a new owner in time.
+        """
+        previous = self.name_owner(bus_name)
+        deadline = time.monotonic() + timeout
+        try:
+            from gi.repository import Gio, GLib
+        except ImportError:
+            Gio = None
+
+        if Gio is None:
+            start()
+            while True:
+                owner = self.name_owner(bus_name)
+                if owner is not None and owner != previous:
+                    break
+                if time.monotonic() >= deadline:
+                    return False
+                time.sleep(OWNER_POLL_INTERVAL)
+        else:
+            # Signals are dispatched to the main context of the thread subscribing: use our own, so that
+            # this works from any thread and whatever else runs a GLib main loop
+            context = GLib.MainContext.new()
+            context.push_thread_default()
+            try:
+                connection = Gio.bus_get_sync(Gio.BusType.SESSION, None)
+                owners = []
+                subscription = connection.signal_subscribe(
+                    "org.freedesktop.DBus",
+                    "org.freedesktop.DBus",
+                    "NameOwnerChanged",
+                    "/org/freedesktop/DBus",
+                    bus_name,
+                    Gio.DBusSignalFlags.NONE,
+                    lambda *signal: owners.append(signal[5].unpack()[2]),
+                )
+                try:
+                    start()
+                    while not any(owner and owner != previous for owner in owners):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            return False
+                        # Wake up at the deadline at the latest
+                        timer = GLib.timeout_source_new(int(remaining * 1000) + 1)
+                        timer.set_callback(lambda *args: False)
+                        timer.attach(context)
+                        context.iteration(True)
+                        timer.destroy()
+                finally:
+                    connection.signal_unsubscribe(subscription)
+            finally:
+                context.pop_thread_default()
+
+        return True
+
+    def call_many_async(
+            self,
+            calls: list,
+            timeout: float = None,
+        ) -> list:
+        """Issues several D-Bus method calls at once and gathers their replies.
+
+        Every call is sent before waiting for any reply, so the round trips overlap instead of adding up.
+        No main loop is needed: replies are collected by blocking on each pending call in turn. The calls
+        to the services skipped by the breaker are not sent, and the breaker learns the outcome once per
+        service, after the whole batch: a hung service timing out on several calls is one failure.
+
+        Args:
+            calls (list): (bus_name, object_path, interface, method, args) tuples, args being a tuple.
+            timeout (float, optional): The timeout of each call, in seconds. Defaults to call_timeout.
+
+        Returns:
+            list: One (reply_args, exception) tuple per call, in the same order as calls. reply_args is the
+                list of values returned by the method, exception is a CallTimeout or a DBusException (None
+                on success).
+        """
+        results = [None] * len(calls)
+        timed_out = set()
+        replied = set()
+
+        def reply_handler(index: int, timeout: float):
+            bus_name, object_path, interface, method, _ = calls[index]
+            sent = time.perf_counter_ns()
+
+            def handler(message: dbus.lowlevel.Message) -> None:
+                tracing.record(f"dbus {interface}.{method}", sent, time.perf_counter_ns(), bus_name=bus_name, object_path=object_path)
+                if isinstance(message, dbus.lowlevel.ErrorMessage):
+                    error = dbus.exceptions.DBusException(*message.get_args_list(), name=message.get_error_name())
+                    if error.get_dbus_name() in TIMEOUT_ERRORS:
+                        timed_out.add(bus_name)
+                        error = CallTimeout(f"Timed out: no reply from {bus_name} to {method} within {timeout:.1f}s")
+                    results[index] = (None, error)
+                else:
+                    replied.add(bus_name)
+                    results[index] = (message.get_args_list(), None)
+            return handler
+
+        bus = self.bus
+        pending_calls = []
+        for index, (bus_name, object_path, interface, method, args) in enumerate(calls):
+            try:
+                self._check_breaker(bus_name)
+                call_timeout = self.remaining(timeout)
+            except CallTimeout as e:
+                results[index] = (None, e)
+                continue
+            message = dbus.lowlevel.MethodCallMessage(bus_name, object_path, interface, method)
+            if args:
+                message.append(*args)
+            pending_calls.append(bus.send_message_with_reply(message, reply_handler(index, call_timeout), call_timeout, require_main_loop=False))
+
+        # Everything is in flight, now wait for the replies
+        for pending_call in pending_calls:
+            pending_call.block()
+        if self.breaker is not None and (timed_out or replied):
+            self.breaker.record(failed=timed_out, succeeded=replied)
+        return results
+
+
+# The connection manager shared by the whole script
+session_bus = SessionBusManager()
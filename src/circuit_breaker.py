@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import logging
+import threading
+
+logger = logging.getLogger("LightHouse")
+
+
+class CallTimeout(RuntimeError):
+    """A call did not complete in time: its timeout or the deadline of the switch expired, or the service
+    timed out recently and is skipped for now (see CircuitBreaker)."""
+
+
+class CircuitBreaker:
+    """Remembers the D-Bus services that timed out recently, so that the next runs skip them instead of
+    waiting for them again.
+
+    A service that times out is skipped for cooldown seconds, then tried again: timing out once more
+    doubles its cooldown (up to max_cooldown), replying closes the circuit. The state is kept on disk, as
+    most runs are short-lived processes (shortcuts, the scheduler). Services are identified by their bus
+    name, so a wedged Konsole instance (org.kde.konsole-<PID>) does not hold back the other ones.
+    """
+
+    def __init__(
+            self,
+            state_file: str,
+            cooldown: float,
+            max_cooldown: float = 3600,
+        ) -> None:
+        """
+        Args:
+            state_file (str): The JSON file where the services that timed out are kept.
+            cooldown (float): How long a service is skipped after timing out, in seconds.
+            max_cooldown (float, optional): The longest cooldown after repeated timeouts, in seconds.
+                Defaults to 3600.
+        """
+        self.state_file = state_file
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._lock = threading.Lock()
+        self._services = None
+
+    def _load(self) -> dict:
+        if self._services is None:
+            try:
+                with open(self.state_file, "r") as f:
+                    self._services = json.load(f)
+            except (OSError, ValueError):
+                self._services = {}
+        return self._services
+
+    def _save(self) -> None:
+        from atomicfile import write_atomically
+
+        now = time.time()
+        # Forget the services that have not timed out for long, e.g. Konsole instances closed since
+        services = {name: entry for name, entry in self._services.items() if entry["until"] > now - self.max_cooldown}
+        try:
+            os.makedirs(os.path.dirname(self.state_file), exist_ok=True)
+            write_atomically(self.state_file, json.dumps(services))
+        except OSError as e:
+            logger.warning("[bus] Unable to save %s: %s", self.state_file, e)
+
+    def open_for(self, service: str) -> float:
+        """Returns how long the service is still skipped.
+
+        Args:
+            service (str): The bus name of the service.
+
+        Returns:
+            float: The time left, in seconds, 0 if the service may be called.
+        """
+        with self._lock:
+            entry = self._load().get(service)
+        if entry is None:
+            return 0
+        return max(entry["until"] - time.time(), 0)
+
+    def failed(self, service: str) -> None:
+        """Records that the service timed out.
+
+        Args:
+            service (str): The bus name of the service.
+        """
+        self.record(failed=[service])
+
+    def succeeded(self, service: str) -> None:
+        """Records that the service replied in time.
+
+        Args:
+            service (str): The bus name of the service.
+        """
+        self.record(succeeded=[service])
+
+    def record(
+            self,
+            failed: list = (),
+            succeeded: list = (),
+        ) -> None:
+        """Records the outcome of several services at once, with a single write of the state.
+
+        Args:
+            failed (list, optional): The bus names of the services that timed out. Each one counts once.
+            succeeded (list, optional): The bus names of the services that replied in time.
+        """
+        with self._lock:
+            services = self._load()
+            changed = False
+            for service in set(failed):
+                failures = services.get(service, {}).get("failures", 0) + 1
+                cooldown = min(self.cooldown * 2 ** (failures - 1), self.max_cooldown)
+                services[service] = {"failures": failures, "until": time.time() + cooldown}
+                logger.warning("[bus] %s timed out, skipping it for %.0fs", service, cooldown)
+                changed = True
+            for service in set(succeeded) - set(failed):
+                if service in services:
+                    logger.info("[bus] %s replies again", service)
+                    del services[service]
+                    changed = True
+            if changed:
+                self._save()
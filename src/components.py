@@ -0,0 +1,189 @@
+import importlib
+import threading
+
+
+def _resolve(target):
+    """Returns the function itself, or imports it if given as a "module:function" string."""
+    if not isinstance(target, str):
+        return target
+    module, _, attribute = target.partition(":")
+    return getattr(importlib.import_module(module), attribute)
+
+
+class Component:
+    """A themed target LightHouse can switch: its command line option, and how to validate, probe and apply
+    its theme.
+
+    The functions may be given as "module:function" strings: the module is then imported the first time
+    one of them is needed, i.e. only by the runs actually switching this component. A new target (Kate,
+    Firefox, alacritty...) lives in its own module and costs nothing to the runs that do not use it.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            argument: str,
+            short_opt: str,
+            long_opt: str,
+            help: str,
+            apply,
+            metavar: str = None,
+            check=None,
+            files=None,
+            resources=None,
+            read=None,
+            depends: tuple = (),
+            overrides: tuple = (),
+            profile_key: str = None,
+            path: bool = False,
+            failure_message: str = None,
+            partial_message: str = None,
+        ) -> None:
+        """
+        Args:
+            name (str): The name of the component, e.g. "plasma" (state cache, results, notifications).
+            argument (str): The switch_theme() argument holding its theme, e.g. "plasma_theme".
+            short_opt (str): Its short command line option, without the dash, "" for none.
+            long_opt (str): Its long command line option, without the dashes.
+            help (str): What the option does, for --help.
+            apply (callable): Takes the theme, applies it. Raises an exception or returns False on failure.
+            metavar (str, optional): The value of the option, for --help. Defaults to None, i.e. a flag
+                taking no value (the theme is then True).
+            check (callable, optional): Takes the theme, raises RuntimeError if it does not exist.
+            files (callable, optional): Returns the files whose content reflects the state of the component
+                (see state_cache.StateCache). Defaults to None: an action, never skipped.
+            resources (callable, optional): Takes the theme, returns the paths check looks at (see
+                profiles.ProfileCache).
+            read (callable, optional): Returns the theme currently set, read from the first of its files.
+                Defaults to None: the component cannot be watched (see --watch).
+            depends (tuple, optional): The components applied before this one, when requested too. They
+                must be registered before this one, see ComponentRegistry.register().
+            overrides (tuple, optional): The components whose settings this one replaces: requested
+                together with it, their state is a different one than when requested alone.
+            profile_key (str, optional): Its key in a profile of the configuration file. Defaults to name.
+            path (bool, optional): True if the theme is a file, relative to the configuration file in a
+                profile. Defaults to False.
+            failure_message (str, optional): Notified when applying fails.
+            partial_message (str, optional): Notified instead of failure_message when apply returns False:
+                the theme is applied, only some bookkeeping failed. Defaults to None.
+        """
+        self.name = name
+        self.argument = argument
+        self.short_opt = short_opt
+        self.long_opt = long_opt
+        self.help = help
+        self.metavar = metavar
+        self.depends = tuple(depends)
+        self.overrides = tuple(overrides)
+        self.profile_key = profile_key or name
+        self.path = path
+        self.failure_message = failure_message or f"Error when applying {name}..."
+        self.partial_message = partial_message
+        self._targets = {"apply": apply, "check": check, "files": files, "resources": resources, "read": read}
+        self._lock = threading.Lock()
+
+    def _function(self, role: str):
+        with self._lock:
+            function = self._targets[role] = _resolve(self._targets[role])
+        return function
+
+    @property
+    def can_check(self) -> bool:
+        return self._targets["check"] is not None
+
+    @property
+    def can_read(self) -> bool:
+        return self._targets["read"] is not None
+
+    def apply(self, theme):
+        """Applies the theme, importing the backend first if needed."""
+        return self._function("apply")(theme)
+
+    def check(self, theme) -> None:
+        """Raises RuntimeError if the theme does not exist (nothing is checked without a check function)."""
+        if self.can_check:
+            self._function("check")(theme)
+
+    def files(self) -> list:
+        """Returns the files reflecting the state of the component, None for an action."""
+        files = self._function("files")
+        return None if files is None else files()
+
+    def resources(self, theme) -> list:
+        """Returns the paths the check of the theme looks at."""
+        resources = self._function("resources")
+        return [] if resources is None else resources(theme)
+
+    def read(self):
+        """Returns the theme currently set, see --watch."""
+        return self._function("read")()
+
+
+class ComponentRegistry:
+    """The components LightHouse knows, in the order of --help, with their command line options."""
+
+    def __init__(self) -> None:
+        self._components = {}
+
+    def register(self, component: Component) -> Component:
+        """Adds a component.
+
+        A component may only depend on components registered before it: a typo in a dependency is an
+        error, and the dependencies cannot form a cycle (which would never let any of them start).
+
+        Raises:
+            ValueError: If its name, argument or options are taken already, or it depends on a component
+                not registered yet.
+        """
+        unknown = [name for name in component.depends if name not in self._components]
+        if unknown:
+            raise ValueError(f"Component {component.name} depends on unknown components: {', '.join(unknown)}")
+        for other in self._components.values():
+            if (component.name == other.name or component.argument == other.argument
+                    or component.long_opt == other.long_opt or (component.short_opt and component.short_opt == other.short_opt)):
+                raise ValueError(f"Component {component.name} clashes with {other.name}")
+        self._components[component.name] = component
+        return component
+
+    def __getitem__(self, name: str) -> Component:
+        return self._components[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._components
+
+    def __iter__(self):
+        return iter(self._components.values())
+
+    def short_opts(self) -> str:
+        """The short options of the components, in getopt format (e.g. "p:r")."""
+        return "".join(c.short_opt + (":" if c.metavar else "") for c in self if c.short_opt)
+
+    def long_opts(self) -> list:
+        """The long options of the components, in getopt format (e.g. ["plasma=", "restart-plasmashell"])."""
+        return [c.long_opt + ("=" if c.metavar else "") for c in self]
+
+    def themes_from_options(self, options: list) -> dict:
+        """Extracts the themes to be applied from the parsed command line options.
+
+        Args:
+            options (list): The (option, value) pairs returned by getopt.
+
+        Returns:
+            dict: The keyword arguments of switch_theme(), "" (False for flags) for the themes not given.
+        """
+        themes = {c.argument: "" if c.metavar else False for c in self}
+        for option, value in options:
+            for c in self:
+                if option in (f"-{c.short_opt}", f"--{c.long_opt}"):
+                    themes[c.argument] = value if c.metavar else True
+        return themes
+
+    def help_entries(self) -> list:
+        """The (usage, description) of the options of the components, for --help."""
+        return [
+            (
+                (f"-{c.short_opt}, " if c.short_opt else "") + f"--{c.long_opt}" + (f" = {c.metavar}" if c.metavar else ""),
+                c.help,
+            )
+            for c in self
+        ]
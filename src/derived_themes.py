@@ -0,0 +1,295 @@
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+
+import tracing
+
+logger = logging.getLogger("LightHouse")
+
+# Where each color of the palette is taken from in a Plasma color scheme: (group, key) candidates, in order
+PALETTE = {
+    "background": [("Colors:View", "BackgroundNormal")],
+    "foreground": [("Colors:View", "ForegroundNormal")],
+    "black": [("Colors:Window", "BackgroundNormal"), ("Colors:View", "BackgroundNormal")],
+    "red": [("Colors:View", "ForegroundNegative")],
+    "green": [("Colors:View", "ForegroundPositive")],
+    "yellow": [("Colors:View", "ForegroundNeutral")],
+    "blue": [("Colors:View", "ForegroundLink"), ("Colors:View", "DecorationFocus")],
+    "magenta": [("Colors:View", "ForegroundVisited")],
+    "cyan": [("Colors:View", "DecorationHover"), ("Colors:View", "DecorationFocus")],
+    "white": [("Colors:View", "ForegroundNormal")],
+    "window": [("Colors:Window", "BackgroundNormal"), ("Colors:View", "BackgroundNormal")],
+    "window_foreground": [("Colors:Window", "ForegroundNormal"), ("Colors:View", "ForegroundNormal")],
+    "header": [("Colors:Header", "BackgroundNormal"), ("Colors:Window", "BackgroundNormal"), ("Colors:View", "BackgroundNormal")],
+    "alternate": [("Colors:Window", "BackgroundAlternate"), ("Colors:View", "BackgroundAlternate"), ("Colors:View", "BackgroundNormal")],
+    "selection": [("Colors:Selection", "BackgroundNormal"), ("Colors:View", "DecorationFocus")],
+    "selection_foreground": [("Colors:Selection", "ForegroundNormal"), ("Colors:View", "ForegroundNormal")],
+    "focus": [("Colors:View", "DecorationFocus"), ("Colors:Selection", "BackgroundNormal")],
+}
+
+# The ANSI colors, in the order of Konsole's Color0..Color7
+ANSI = ("black", "red", "green", "yellow", "blue", "magenta", "cyan", "white")
+
+# VSCode's color overrides (workbench.colorCustomizations), from the palette
+VSCODE_COLORS = {
+    "editor.background": "background",
+    "editor.foreground": "foreground",
+    "editor.selectionBackground": "selection",
+    "focusBorder": "focus",
+    "activityBar.background": "window",
+    "activityBar.foreground": "window_foreground",
+    "sideBar.background": "window",
+    "sideBar.foreground": "window_foreground",
+    "panel.background": "window",
+    "titleBar.activeBackground": "header",
+    "titleBar.activeForeground": "window_foreground",
+    "statusBar.background": "alternate",
+    "statusBar.foreground": "window_foreground",
+    "list.activeSelectionBackground": "selection",
+    "list.activeSelectionForeground": "selection_foreground",
+    "button.background": "selection",
+    "button.foreground": "selection_foreground",
+    "terminal.background": "background",
+    "terminal.foreground": "foreground",
+}
+
+
+def _parse_color(value: str) -> tuple:
+    """Returns the (r, g, b) of a "r,g,b" (or "r,g,b,a") color, None if it is not one."""
+    parts = (value or "").split(",")
+    if len(parts) not in (3, 4) or not all(part.strip().isdigit() for part in parts):
+        return None
+    return tuple(min(int(part), 255) for part in parts[:3])
+
+def _mix(color: tuple, other: tuple, ratio: float) -> tuple:
+    return tuple(round(c + (o - c) * ratio) for c, o in zip(color, other))
+
+def read_palette(scheme_file: str) -> dict:
+    """Reads the palette of a Plasma color scheme (a .colors file).
+
+    Args:
+        scheme_file (str): The path of the color scheme.
+
+    Raises:
+        OSError: If the file cannot be read.
+        ValueError: If the file lacks the view colors.
+
+    Returns:
+        dict: Maps each color of PALETTE to its (r, g, b).
+    """
+    from kconfig import read_kconfig_all
+
+    colors = read_kconfig_all(scheme_file)
+    palette = {}
+    for name, candidates in PALETTE.items():
+        for entry in candidates:
+            color = _parse_color(colors.get(entry))
+            if color is not None:
+                palette[name] = color
+                break
+        else:
+            if name in ("background", "foreground"):
+                raise ValueError(f"{scheme_file} is not a color scheme: missing [Colors:View] {PALETTE[name][0][1]}")
+            palette[name] = palette["foreground"]
+    return palette
+
+def konsole_colorscheme(palette: dict, description: str) -> str:
+    """Returns a Konsole .colorscheme matching the palette.
+
+    The intense colors are lighter (darker on light backgrounds), the faint ones are blended with the
+    background.
+    """
+    dark = sum(palette["background"]) < sum(palette["foreground"])
+    towards = (255, 255, 255) if dark else (0, 0, 0)
+
+    def group(name: str, color: tuple) -> str:
+        return f"[{name}]\nColor={color[0]},{color[1]},{color[2]}\n\n"
+
+    content = ""
+    for name, color in [("Background", palette["background"]), ("Foreground", palette["foreground"])] + [
+        (f"Color{index}", palette[color]) for index, color in enumerate(ANSI)
+    ]:
+        content += group(name, color)
+        content += group(f"{name}Intense", _mix(color, towards, 0.25))
+        content += group(f"{name}Faint", _mix(color, palette["background"], 0.4))
+    content += f"[General]\nBlur=false\nColorRandomization=false\nDescription={description}\nOpacity=1\nWallpaper=\n"
+    return content
+
+def konsole_profile(name: str) -> str:
+    """Returns a Konsole .profile using the color scheme with the same name, everything else by default."""
+    return f"[Appearance]\nColorScheme={name}\n\n[General]\nName={name}\nParent=FALLBACK/\n"
+
+def vscode_colors(palette: dict) -> dict:
+    """Returns VSCode's color overrides (workbench.colorCustomizations) matching the palette."""
+    def hex_color(color: tuple) -> str:
+        return "#{:02x}{:02x}{:02x}".format(*color)
+
+    colors = {key: hex_color(palette[color]) for key, color in VSCODE_COLORS.items()}
+    dark = sum(palette["background"]) < sum(palette["foreground"])
+    towards = (255, 255, 255) if dark else (0, 0, 0)
+    for color in ANSI:
+        colors[f"terminal.ansi{color.capitalize()}"] = hex_color(palette[color])
+        colors[f"terminal.ansiBright{color.capitalize()}"] = hex_color(_mix(palette[color], towards, 0.25))
+    return colors
+
+
+class DerivedThemes:
+    """Konsole profiles and VSCode color overrides derived from Plasma color schemes, built once per scheme.
+
+    The artifacts are content-addressed: they are named after the hash of the color scheme file, so a
+    switch to a scheme seen before costs one read of the scheme and one of the manifest, and editing a
+    scheme simply leads to new artifacts. The Konsole .colorscheme and .profile files are written where
+    Konsole looks for them (~/.local/share/konsole/), the manifests (the name of the Konsole profile and
+    the VSCode colors) in the cache directory.
+
+    The VSCode colors LightHouse sets, and the user's values they replace, are kept in the cache
+    directory too (vscode_colors.json), so that they can be removed again, see restore_vscode_colors().
+    """
+
+    def __init__(
+            self,
+            konsole_dir: str,
+            cache_dir: str,
+        ) -> None:
+        """
+        Args:
+            konsole_dir (str): The directory of the user's Konsole profiles and color schemes.
+            cache_dir (str): The directory of the manifests.
+        """
+        self.konsole_dir = konsole_dir
+        self.cache_dir = cache_dir
+        self.overrides_file = os.path.join(cache_dir, "vscode_colors.json")
+        self._lock = threading.Lock()
+
+    @tracing.traced
+    def get(self, scheme_file: str) -> dict:
+        """Returns the artifacts derived from the given color scheme, building them if needed.
+
+        Args:
+            scheme_file (str): The path of the Plasma color scheme (.colors).
+
+        Raises:
+            OSError: If the scheme cannot be read or the artifacts cannot be written.
+            ValueError: If the file is not a color scheme.
+
+        Returns:
+            dict: {"konsole_profile": the name of the Konsole profile, "vscode_colors": the VSCode color
+                overrides}.
+        """
+        from atomicfile import write_atomically
+
+        with open(scheme_file, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:16]
+        scheme = re.sub(r"[^A-Za-z0-9_-]+", "", os.path.splitext(os.path.basename(scheme_file))[0])
+        name = f"LightHouse-{scheme}-{digest[:8]}"
+        manifest = os.path.join(self.cache_dir, f"{digest}.json")
+        konsole_files = [os.path.join(self.konsole_dir, name + ext) for ext in (".colorscheme", ".profile")]
+
+        with self._lock:
+            try:
+                with open(manifest, "r") as f:
+                    artifacts = json.load(f)
+                if all(os.path.isfile(path) for path in konsole_files):
+                    return artifacts
+            except (OSError, ValueError):
+                pass
+
+            logger.debug("[derived] Building %s from %s", name, scheme_file)
+            palette = read_palette(scheme_file)
+            artifacts = {"konsole_profile": name, "vscode_colors": vscode_colors(palette)}
+            os.makedirs(self.konsole_dir, exist_ok=True)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            write_atomically(konsole_files[0], konsole_colorscheme(palette, f"LightHouse: {scheme}"), 0o644)
+            write_atomically(konsole_files[1], konsole_profile(name), 0o644)
+            # Last: a manifest is only there if its artifacts are complete
+            write_atomically(manifest, json.dumps(artifacts))
+            return artifacts
+
+    def _load_overrides(self) -> dict:
+        try:
+            with open(self.overrides_file, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @property
+    def has_vscode_colors(self) -> bool:
+        """True if some VSCode colors set by LightHouse may still be in place."""
+        return bool(self._load_overrides())
+
+    def override_vscode_colors(
+            self,
+            current: dict,
+            colors: dict,
+        ) -> dict:
+        """Returns the VSCode color customizations with the derived colors in place.
+
+        The values they replace are recorded first (the user's values, not the ones of a previous
+        derivation), so that restore_vscode_colors() can put them back.
+
+        Args:
+            current (dict): The current "workbench.colorCustomizations".
+            colors (dict): The derived colors, see vscode_colors().
+
+        Raises:
+            OSError: If the replaced values cannot be recorded.
+
+        Returns:
+            dict: The new "workbench.colorCustomizations".
+        """
+        from atomicfile import write_atomically
+
+        with self._lock:
+            recorded = self._load_overrides()
+            customizations = self._restore(current, recorded)
+            overrides = {key: {"previous": customizations.get(key), "applied": value} for key, value in colors.items()}
+            if overrides != recorded:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                # Before settings.json is written: a replaced value must never be lost
+                write_atomically(self.overrides_file, json.dumps(overrides))
+        return {**customizations, **colors}
+
+    def restore_vscode_colors(self, current: dict) -> dict:
+        """Returns the VSCode color customizations without the derived colors, see override_vscode_colors().
+
+        The user's values are put back, the keys LightHouse added are removed. A color changed since it
+        was derived (e.g. by hand) is left as it is.
+
+        Args:
+            current (dict): The current "workbench.colorCustomizations".
+
+        Returns:
+            dict: The new "workbench.colorCustomizations".
+        """
+        with self._lock:
+            return self._restore(current, self._load_overrides())
+
+    def forget_vscode_colors(self) -> None:
+        """Drops the record of the derived VSCode colors, once they are restored.
+
+        Raises:
+            OSError: If the record cannot be removed.
+        """
+        with self._lock:
+            try:
+                os.unlink(self.overrides_file)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _restore(
+            current: dict,
+            overrides: dict,
+        ) -> dict:
+        customizations = dict(current)
+        for key, entry in overrides.items():
+            if customizations.get(key) != entry["applied"]:
+                continue
+            if entry["previous"] is None:
+                del customizations[key]
+            else:
+                customizations[key] = entry["previous"]
+        return customizations
@@ -0,0 +1,177 @@
+import re
+import json
+
+import tracing
+from atomicfile import write_atomically
+
+# The tokens of JSON with comments (VSCode's settings.json): comments and trailing commas are allowed
+TOKEN = re.compile(r"""
+      (?P<string>"(?:[^"\\]|\\.)*")
+    | (?P<comment>//[^\n]*|/\*.*?\*/)
+    | (?P<space>\s+)
+    | (?P<punct>[{}\[\]:,])
+    | (?P<literal>[^\s{}\[\]:,"/]+)
+""", re.VERBOSE | re.DOTALL)
+
+# Returned by an update callable to leave its key as it is (a missing key is not added), see update_jsonc()
+KEEP = object()
+
+
+def tokenize(text: str):
+    """Yields the (kind, start, end) tokens of a JSONC document.
+
+    Args:
+        text (str): The document.
+
+    Raises:
+        ValueError: If the document contains something that is not a JSONC token (e.g. an unterminated string).
+
+    Yields:
+        tuple: (kind, start, end), kind being "string", "comment", "space", "punct" or "literal".
+    """
+    position = 0
+    while position < len(text):
+        match = TOKEN.match(text, position)
+        if match is None:
+            raise ValueError(f"Invalid JSONC at offset {position}")
+        yield match.lastgroup, match.start(), match.end()
+        position = match.end()
+
+def find_members(text: str) -> tuple:
+    """Locates the members of the top-level object of a JSONC document, in a single pass.
+
+    Args:
+        text (str): The document.
+
+    Raises:
+        ValueError: If the document is not a JSONC object.
+
+    Returns:
+        tuple: (members, last_end, closing), members mapping each top-level key to the (start, end)
+            span of its value, last_end being the end of the last significant token before the closing
+            brace of the object and closing the offset of that brace.
+    """
+    members = {}
+    depth = 0
+    expect = None
+    key = None
+    value_start = None
+    last_end = None
+    for kind, start, end in tokenize(text):
+        if kind in ("space", "comment"):
+            continue
+        token = text[start:end]
+        if depth == 0:
+            if token != "{":
+                raise ValueError(f"Expected a JSONC object at offset {start}")
+            depth, expect = 1, "key"
+        elif depth == 1 and expect == "key":
+            if kind == "string":
+                key, expect = json.loads(token), "colon"
+            elif token == "}":
+                return members, last_end, start
+            elif token != ",":
+                raise ValueError(f"Expected a key at offset {start}")
+        elif depth == 1 and expect == "colon":
+            if token != ":":
+                raise ValueError(f"Expected ':' at offset {start}")
+            expect = "value"
+        elif depth == 1 and expect == "value":
+            if token in ("{", "["):
+                depth, value_start, expect = 2, start, "nested"
+            else:
+                members[key], expect = (start, end), "key"
+        elif token in ("{", "["):
+            depth += 1
+        elif token in ("}", "]"):
+            depth -= 1
+            if depth == 1:
+                members[key], expect = (value_start, end), "key"
+        last_end = end
+    raise ValueError("Unterminated JSONC object")
+
+def read_jsonc(
+        path: str,
+        keys: list,
+    ) -> dict:
+    """Reads some top-level keys of a JSONC file (e.g. VSCode's settings.json), parsing only their values.
+
+    Args:
+        path (str): The path of the file.
+        keys (list): The keys to read.
+
+    Raises:
+        OSError: If the file cannot be read.
+        ValueError: If the file is not a JSONC object.
+
+    Returns:
+        dict: Maps each key to its value, None if missing.
+    """
+    with open(path, "r") as f:
+        text = f.read()
+    members, _, _ = find_members(text)
+    return {key: json.loads(text[members[key][0]:members[key][1]]) if key in members else None for key in keys}
+
+@tracing.traced
+def update_jsonc(
+        path: str,
+        updates: dict,
+    ) -> dict:
+    """Sets some top-level keys of a JSONC file (e.g. VSCode's settings.json) with a single read and write.
+
+    Only the values of the given keys are replaced: formatting and comments are left untouched.
+    Missing keys are added at the end of the object. The file is written atomically.
+
+    Args:
+        path (str): The path of the file.
+        updates (dict): Maps each key to its new value (any JSON value), or to a callable computing the
+            new value from the current one (None if the key is missing), or returning KEEP. The callables
+            are called in the order of updates.
+
+    Raises:
+        OSError: If the file cannot be read or written.
+        ValueError: If the file is not a JSONC object.
+
+    Returns:
+        dict: Maps each key to its previous value, None if it was missing.
+    """
+    with open(path, "r") as f:
+        text = f.read()
+    members, last_end, closing = find_members(text)
+
+    previous = {}
+    splices = []
+    missing = []
+    for key, value in updates.items():
+        span = members.get(key)
+        previous[key] = json.loads(text[span[0]:span[1]]) if span else None
+        if callable(value):
+            value = value(previous[key])
+        if value is KEEP:
+            continue
+        if span is None:
+            missing.append((key, value))
+        elif previous[key] != value:
+            splices.append((span[0], span[1], json.dumps(value, ensure_ascii=False)))
+
+    if missing:
+        # Follow the indentation of the first member, if any
+        indent = "    "
+        if members:
+            first = min(start for start, _ in members.values())
+            line_start = text.rfind("\n", 0, first) + 1
+            indent = re.match(r"[ \t]*", text[line_start:]).group() or indent
+        added = "".join(f"\n{indent}{json.dumps(key)}: {json.dumps(value, ensure_ascii=False)}," for key, value in missing)
+        if last_end is not None and text[last_end - 1] not in "{,":
+            # The last member has no trailing comma
+            added = "," + added
+        # Insert right after the last member (or the opening brace), before any comment or newline
+        insert_at = last_end if last_end is not None else closing
+        splices.append((insert_at, insert_at, added[:-1] + ("\n" if text[insert_at] == "}" else "")))
+
+    if not splices:
+        return previous
+    for start, end, replacement in sorted(splices, reverse=True):
+        text = text[:start] + replacement + text[end:]
+    write_atomically(path, text)
+    return previous
@@ -0,0 +1,153 @@
+import tracing
+from atomicfile import write_atomically
+
+
+def _parse_group(line: str) -> str:
+    """Returns the group declared by a "[Group]" line ("Colors][View" for "[Colors][View]"), None otherwise."""
+    stripped = line.strip()
+    if stripped.startswith("[") and stripped.endswith("]"):
+        return stripped[1:-1]
+    return None
+
+def _parse_key(line: str) -> str:
+    """Returns the key of a "key=value" line, without its "[$e]"-like flags, None otherwise."""
+    stripped = line.strip()
+    if not stripped or stripped.startswith("#") or "=" not in stripped:
+        return None
+    key = stripped.split("=", 1)[0].strip()
+    if key.endswith("]") and "[$" in key:
+        key = key[:key.index("[$")]
+    return key
+
+@tracing.traced
+def read_kconfig(
+        path: str,
+        entries: list,
+    ) -> dict:
+    """Reads some entries of a KDE configuration file (kdeglobals, konsolerc, kwinrc...), in a single pass.
+
+    Args:
+        path (str): The path of the configuration file.
+        entries (list): The (group, key) tuples to read, e.g. ("KDE", "LookAndFeelPackage").
+            Nested groups are written as in the file without the outer brackets, e.g. "Colors][View".
+
+    Returns:
+        dict: Maps each (group, key) tuple to its value, None if missing (or if the file does not exist).
+    """
+    values = dict.fromkeys(entries)
+    wanted = set(entries)
+    group = ""
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                new_group = _parse_group(line)
+                if new_group is not None:
+                    group = new_group
+                    continue
+                key = _parse_key(line)
+                if key is not None and (group, key) in wanted:
+                    values[(group, key)] = line.split("=", 1)[1].strip()
+    except FileNotFoundError:
+        pass
+    return values
+
+def read_kconfig_all(path: str) -> dict:
+    """Reads every entry of a KDE configuration file, e.g. the "contents/defaults" of a look-and-feel package.
+
+    Args:
+        path (str): The path of the configuration file.
+
+    Raises:
+        OSError: If the file cannot be read.
+
+    Returns:
+        dict: Maps each (group, key) tuple to its value, in the order of the file.
+    """
+    values = {}
+    group = ""
+    with open(path, "r") as f:
+        for line in f:
+            new_group = _parse_group(line)
+            if new_group is not None:
+                group = new_group
+                continue
+            key = _parse_key(line)
+            if key is not None:
+                values[(group, key)] = line.split("=", 1)[1].strip()
+    return values
+
+@tracing.traced
+def update_kconfig(
+        path: str,
+        updates: dict,
+    ) -> dict:
+    """Sets some entries of a KDE configuration file, with a single read and a single atomic write.
+
+    Only the given keys inside the given groups are changed, everything else is kept as is. Missing
+    keys are added at the end of their group, missing groups at the end of the file. The new content
+    is written atomically (see atomicfile.write_atomically()), so a crash never leaves a truncated
+    configuration behind.
+
+    Args:
+        path (str): The path of the configuration file.
+        updates (dict): Maps (group, key) tuples to the new values, e.g. {("KDE", "LookAndFeelPackage"): "org.kde.breeze.desktop"}.
+
+    Raises:
+        OSError: If the configuration file cannot be written.
+
+    Returns:
+        dict: Maps each (group, key) tuple to its previous value, None if it was missing. The file is
+            not written at all if every entry already has the requested value.
+    """
+    previous = dict.fromkeys(updates)
+    pending = dict(updates)
+    output = []
+
+    def flush_group(group: str) -> None:
+        # Add the keys of the group that were not found, before the trailing blank lines
+        missing = [(key, value) for (g, key), value in list(pending.items()) if g == group]
+        if not missing:
+            return
+        position = len(output)
+        while position > 0 and not output[position - 1].strip():
+            position -= 1
+        output[position:position] = [f"{key}={value}\n" for key, value in missing]
+        for key, _ in missing:
+            del pending[(group, key)]
+
+    group = ""
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    line += "\n"
+                new_group = _parse_group(line)
+                if new_group is not None:
+                    flush_group(group)
+                    group = new_group
+                    output.append(line)
+                    continue
+                key = _parse_key(line)
+                if key is not None and (group, key) in pending:
+                    raw_key, value = line.split("=", 1)
+                    previous[(group, key)] = value.strip()
+                    output.append(f"{raw_key}={pending.pop((group, key))}\n")
+                else:
+                    output.append(line)
+    except FileNotFoundError:
+        pass
+    flush_group(group)
+
+    if all(previous[entry] == str(value) for entry, value in updates.items()):
+        # Nothing to change, leave the file (and its modification time) alone
+        return previous
+
+    # Groups not found in the file
+    for group in dict.fromkeys(g for g, _ in pending):
+        if output and output[-1].strip():
+            output.append("\n")
+        output.append(f"[{group}]\n")
+        flush_group(group)
+
+    write_atomically(path, "".join(output))
+    return previous
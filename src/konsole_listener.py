@@ -0,0 +1,134 @@
+import re
+import logging
+
+logger = logging.getLogger("LightHouse")
+
+# The children of an object in the reply of Introspect, e.g. the sessions of a Konsole instance
+CHILD_NODE = re.compile(r"<node name=\"([0-9]+)\"\s*/>")
+
+
+class KonsoleListener:
+    """Applies the current Konsole profile to every Konsole instance as soon as it appears on the bus.
+
+    A new instance registers org.kde.konsole-<PID> (NameOwnerChanged), then its windows and sessions.
+    Each window gets the profile as its default, so that the sessions opened later in that window use
+    it too (Konsole does not signal new sessions on the bus), and the sessions already there get it
+    right away. Windows opened while a switch is in progress, or before Konsole re-reads konsolerc,
+    therefore never keep the previous profile, and no process is ever rescanned.
+
+    Requires PyGObject (python3-gi) for the GLib main loop: signals are only delivered by a main loop.
+    """
+
+    def __init__(
+            self,
+            get_profile,
+            retries: int = 10,
+            retry_interval: int = 200,
+        ) -> None:
+        """
+        Args:
+            get_profile (callable): Returns the name of the Konsole profile to apply (None for none).
+            retries (int, optional): How many times to look for the windows of a new instance, which
+                registers its name before its objects. Defaults to 10.
+            retry_interval (int, optional): The time between two retries, in ms. Defaults to 200.
+        """
+        self.get_profile = get_profile
+        self.retries = retries
+        self.retry_interval = retry_interval
+        self._bus = None
+        self._loop = None
+
+    def run(self) -> None:
+        """Listens for new Konsole instances, until stop() is called.
+
+        Raises:
+            RuntimeError: If PyGObject is not installed.
+        """
+        try:
+            from gi.repository import GLib
+        except ImportError:
+            raise RuntimeError("PyGObject (python3-gi) is needed to apply the Konsole profile to new windows")
+        import dbus
+        from dbus.mainloop.glib import DBusGMainLoop
+
+        # A private connection: the shared one (bus_manager) has no main loop
+        self._bus = dbus.SessionBus(mainloop=DBusGMainLoop(), private=True)
+        self._bus.add_signal_receiver(
+            self._on_name_owner_changed,
+            signal_name="NameOwnerChanged",
+            dbus_interface="org.freedesktop.DBus",
+            path="/org/freedesktop/DBus",
+        )
+        self._loop = GLib.MainLoop()
+        logger.debug("[konsole] Listening for new Konsole instances")
+        self._loop.run()
+
+    def stop(self) -> None:
+        """Stops listening."""
+        if self._loop is not None:
+            self._loop.quit()
+
+    def _on_name_owner_changed(self, name: str, old_owner: str, new_owner: str) -> None:
+        if not name.startswith("org.kde.konsole-") or old_owner or not new_owner:
+            return
+        try:
+            profile = self.get_profile()
+        except (OSError, ValueError) as e:
+            logger.warning("[konsole] Unable to get the current Konsole profile: %s", e)
+            return
+        if profile:
+            logger.debug("[konsole] New instance: %s, applying %s", name, profile)
+            self._apply(str(name), profile, self.retries)
+
+    def _call(
+            self,
+            name: str,
+            object_path: str,
+            interface: str,
+            method: str,
+            signature: str,
+            args: tuple,
+            on_reply=None,
+            on_error=None,
+        ) -> None:
+        def log_error(error):
+            logger.debug("[konsole] %s%s %s.%s failed: %s", name, object_path, interface, method, error)
+        self._bus.call_async(
+            name, object_path, interface, method, signature, args,
+            on_reply or (lambda *reply: None), on_error or log_error,
+        )
+
+    def _apply(
+            self,
+            name: str,
+            profile: str,
+            retries: int,
+        ) -> None:
+        from gi.repository import GLib
+
+        def retry(error=None):
+            if retries > 0:
+                GLib.timeout_add(self.retry_interval, lambda: self._apply(name, profile, retries - 1) or False)
+            else:
+                logger.warning("[konsole] Unable to apply %s to %s: %s", profile, name, error or "no windows")
+
+        def on_windows(xml):
+            windows = CHILD_NODE.findall(str(xml))
+            if not windows:
+                retry()
+                return
+            for window in windows:
+                self._call(name, f"/Windows/{window}", "org.kde.konsole.Window", "setDefaultProfile", "s", (profile,))
+            self._call(name, "/Sessions", "org.freedesktop.DBus.Introspectable", "Introspect", "", (), on_sessions)
+
+        def on_sessions(xml):
+            for session in CHILD_NODE.findall(str(xml)):
+                self._call(name, f"/Sessions/{session}", "org.kde.konsole.Session", "setProfile", "s", (profile,))
+
+        def on_error(error):
+            if error.get_dbus_name() in ("org.freedesktop.DBus.Error.ServiceUnknown", "org.freedesktop.DBus.Error.NameHasNoOwner"):
+                # Closed already
+                return
+            retry(error)
+
+        self._call(name, "/Windows", "org.freedesktop.DBus.Introspectable", "Introspect", "", (), on_windows, on_error)
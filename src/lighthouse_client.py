@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+# Thin client for the LightHouse daemon (see LightHouse.py --daemon).
+# It only forwards the request over a Unix socket: bind this one to global shortcuts to switch theme
+# with a single IPC round trip instead of a cold start of LightHouse.
+#
+# Usage:
+#   lighthouse_client.py apply [-p PLASMA_GLOBAL_THEME] [-g GTK_THEME] [-w WALLPAPER] [-k KONSOLE_PROFILE] [-c VSCODE_THEME]
+#   lighthouse_client.py apply PROFILE
+#   lighthouse_client.py toggle
+
+import os
+import sys
+import json
+import socket
+
+
+def socket_path() -> str:
+    """Returns the path of the Unix socket the LightHouse daemon listens on.
+
+    Returns:
+        str: $XDG_RUNTIME_DIR/lighthouse.sock, or a per-user path in /tmp if XDG_RUNTIME_DIR is not set.
+    """
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "lighthouse.sock")
+    return f"/tmp/lighthouse-{os.getuid()}.sock"
+
+def send_request(method: str, argv: list = None) -> dict:
+    """Sends a request to the LightHouse daemon and waits for its reply.
+
+    Args:
+        method (str): "apply" or "toggle".
+        argv (list, optional): The LightHouse options (or the profile name) of an "apply" request. Defaults to None.
+
+    Raises:
+        OSError: If the daemon is not running.
+
+    Returns:
+        dict: The reply of the daemon: {"ok": bool, "error": str, "components": {name: error or None}}.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path())
+        client.sendall(json.dumps({"method": method, "argv": argv or []}).encode() + b"\n")
+        with client.makefile("rb") as reply:
+            return json.loads(reply.readline())
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] not in ("apply", "toggle"):
+        print(f"Usage: {sys.argv[0]} apply [LightHouse options | PROFILE] | toggle", file=sys.stderr)
+        sys.exit(2)
+
+    try:
+        reply = send_request(sys.argv[1], sys.argv[2:])
+    except OSError as e:
+        print(f"Cannot reach the LightHouse daemon, is 'LightHouse.py --daemon' running? ({e})", file=sys.stderr)
+        sys.exit(1)
+
+    if not reply["ok"]:
+        print(reply["error"], file=sys.stderr)
+        sys.exit(1)
@@ -1,4 +1,7 @@
 import os
+import logging
+import collections
+from logging import handlers
 
 LOGGING = {
     'version': 1,
@@ -16,12 +19,69 @@ LOGGING = {
             'level':'DEBUG',
             'class':'logging.StreamHandler',
             'formatter': 'console'
+        },
+        # The recent DEBUG records, dumped to a file when a component fails (see RingBufferHandler)
+        'ring': {
+            'level': 'DEBUG',
+            '()': 'logging_conf.RingBufferHandler',
+            'capacity': 2000,
+            'formatter': 'console'
         }
     },
     'loggers': {
         'LightHouse': {
-            'handlers': ['console'],
+            'handlers': ['console', 'ring'],
             'level': 'DEBUG',
         }
     }
-}
\ No newline at end of file
+}
+
+
+class RingBufferHandler(logging.Handler):
+    """Keeps the last records in memory, unformatted: they are formatted only if dump() is called.
+
+    This gives full DEBUG diagnostics of a failed run without printing (or even formatting) them in
+    every run.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        """
+        Args:
+            capacity (int): The number of records kept, the oldest ones are dropped first.
+        """
+        super().__init__()
+        self.records = collections.deque(maxlen=capacity)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.records.append(record)
+
+    def dump(self, path: str) -> None:
+        """Writes the records kept so far to a file, replacing it.
+
+        Args:
+            path (str): The path of the file.
+
+        Raises:
+            OSError: If the file cannot be written.
+        """
+        self.acquire()
+        try:
+            records = list(self.records)
+        finally:
+            self.release()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            for record in records:
+                f.write(self.format(record) + "\n")
+
+
+class DeferredQueueHandler(handlers.QueueHandler):
+    """A QueueHandler leaving the formatting of the records to the handlers behind the queue.
+
+    QueueHandler formats the message before enqueuing it, so that records can be pickled: within a
+    single process they do not need to be, and the caller would pay for formatting messages that the
+    handlers may drop anyway (e.g. DEBUG ones when not verbose).
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
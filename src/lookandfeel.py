@@ -0,0 +1,174 @@
+import os
+import logging
+import subprocess
+
+import tracing
+
+logger = logging.getLogger("LightHouse")
+
+# The settings of a look-and-feel package ("contents/defaults") LightHouse knows how to apply by itself,
+# and the sub-component each one belongs to: (file, group, key) -> sub-component
+SETTINGS = {
+    ("kdeglobals", "General", "ColorScheme"): "colors",
+    ("kdeglobals", "Icons", "Theme"): "icons",
+    ("kdeglobals", "KDE", "widgetStyle"): "style",
+    ("plasmarc", "Theme", "name"): "desktoptheme",
+    ("kcminputrc", "Mouse", "cursorTheme"): "cursors",
+    ("kwinrc", "org.kde.kdecoration2", "library"): "decoration",
+    ("kwinrc", "org.kde.kdecoration2", "theme"): "decoration",
+    ("kwinrc", "WindowSwitcher", "LayoutName"): "kwin",
+    ("kwinrc", "DesktopSwitcher", "LayoutName"): "kwin",
+    ("ksplashrc", "KSplash", "Theme"): "splash",
+}
+
+# The sub-components applied by a Plasma tool, given the new value
+TOOLS = {
+    "colors": "plasma-apply-colorscheme",
+    "desktoptheme": "plasma-apply-desktoptheme",
+    "cursors": "plasma-apply-cursortheme",
+}
+
+# Groups of the defaults file not prefixed by their configuration file
+BARE_GROUPS = {
+    "KSplash": "ksplashrc",
+    # Only applied by lookandfeeltool when resetting the desktop layout, never by LightHouse
+    "Wallpaper": None,
+}
+
+# KGlobalSettings.notifyChange() change types, see KGlobalSettings::ChangeType
+STYLE_CHANGED = 2
+ICON_CHANGED = 4
+
+
+def package_defaults(defaults_file: str) -> dict:
+    """Reads the settings applied by a look-and-feel package.
+
+    Args:
+        defaults_file (str): The "contents/defaults" file of the package.
+
+    Raises:
+        OSError: If the file cannot be read.
+
+    Returns:
+        dict: Maps each (file, group, key) tuple to its value, e.g. ("kdeglobals", "Icons", "Theme").
+    """
+    from kconfig import read_kconfig_all
+
+    defaults = {}
+    for (group, key), value in read_kconfig_all(defaults_file).items():
+        if group in BARE_GROUPS:
+            if BARE_GROUPS[group] is not None:
+                defaults[(BARE_GROUPS[group], group, key)] = value
+            continue
+        file, _, group = group.partition("][")
+        defaults[(file, group, key)] = value
+    return defaults
+
+@tracing.traced
+def pending_changes(
+        config_dir: str,
+        defaults: dict,
+    ) -> dict:
+    """Compares the settings of a package with the current ones, reading each configuration file once.
+
+    Args:
+        config_dir (str): The directory of the configuration files (~/.config).
+        defaults (dict): The settings of the package, see package_defaults().
+
+    Raises:
+        RuntimeError: If a setting that differs cannot be applied by apply_changes(), or belongs to no
+            configuration file: the package must be applied by lookandfeeltool.
+
+    Returns:
+        dict: Maps each sub-component to change ("colors", "icons"...) to its {(file, group, key): value}.
+    """
+    from kconfig import read_kconfig
+
+    by_file = {}
+    for file, group, key in defaults:
+        if not file or "/" in file:
+            raise RuntimeError(f"Unknown configuration file for [{group}] {key}")
+        by_file.setdefault(file, []).append((group, key))
+
+    changes = {}
+    for file, entries in by_file.items():
+        current = read_kconfig(os.path.join(config_dir, file), entries)
+        for (group, key), value in current.items():
+            if value == defaults[(file, group, key)]:
+                continue
+            component = SETTINGS.get((file, group, key))
+            if component is None:
+                raise RuntimeError(f"No dedicated way to apply [{group}] {key} of {file}")
+            changes.setdefault(component, {})[(file, group, key)] = defaults[(file, group, key)]
+    return changes
+
+@tracing.traced
+def apply_changes(
+        config_dir: str,
+        changes: dict,
+        timeout: float,
+    ) -> None:
+    """Applies the given sub-components of a package, each one through its own reload path.
+
+    The settings without a Plasma tool are written to their configuration file first, as the tools
+    rewrite some of these files too (kdeglobals). Then the colors, the Plasma style and the cursors go
+    through their Plasma tools, run concurrently, while the running applications are told to reload the
+    other settings: a signal for the icons and the widget style, a reconfiguration of KWin for the window
+    decorations and switchers. The splash screen is only read at the next login. On failure, the tools
+    still running are killed.
+
+    Args:
+        config_dir (str): The directory of the configuration files (~/.config).
+        changes (dict): The sub-components to change, see pending_changes().
+        timeout (float): How long the tools may take, in seconds.
+
+    Raises:
+        OSError: If a tool cannot be run or a configuration file cannot be written.
+        CallTimeout: If a tool or KWin does not complete in time.
+        RuntimeError: If a tool fails.
+    """
+    from kconfig import update_kconfig
+    from bus_manager import session_bus, CallTimeout
+    import dbus
+
+    updates = {}
+    for component, entries in changes.items():
+        if component not in TOOLS:
+            for (file, group, key), value in entries.items():
+                updates.setdefault(file, {})[(group, key)] = value
+    for file, entries in updates.items():
+        update_kconfig(os.path.join(config_dir, file), entries)
+
+    processes = []
+    try:
+        for component, tool in TOOLS.items():
+            if component in changes:
+                value = next(iter(changes[component].values()))
+                logger.debug("[plasma] %s %s", tool, value)
+                processes.append((tool, subprocess.Popen([tool, value], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)))
+
+        try:
+            if "icons" in changes:
+                session_bus.emit_signal("/KIconLoader", "org.kde.KIconLoader", "iconChanged", "i", 0)
+                session_bus.emit_signal("/KGlobalSettings", "org.kde.KGlobalSettings", "notifyChange", "ii", ICON_CHANGED, 0)
+            if "style" in changes:
+                session_bus.emit_signal("/KGlobalSettings", "org.kde.KGlobalSettings", "notifyChange", "ii", STYLE_CHANGED, 0)
+            if "decoration" in changes or "kwin" in changes:
+                session_bus.call("org.kde.KWin", "/KWin", "org.kde.KWin", "reconfigure")
+        except dbus.exceptions.DBusException as e:
+            raise RuntimeError(f"Unable to reload the settings: {e}")
+
+        for tool, process in processes:
+            with tracing.span(tool):
+                try:
+                    _, stderr = process.communicate(timeout=session_bus.remaining(timeout))
+                except (subprocess.TimeoutExpired, CallTimeout):
+                    raise CallTimeout(f"Timed out: {tool} did not complete within {timeout}s")
+            if process.returncode != 0:
+                raise RuntimeError(f"{tool} failed ({process.returncode}): {stderr.strip()}")
+    finally:
+        # On failure, no tool is left running (and writing its configuration) behind the next switch
+        for tool, process in processes:
+            if process.poll() is None:
+                process.kill()
+                process.communicate()
@@ -0,0 +1,157 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger("LightHouse")
+
+# Notification levels: (summary, urgency), see https://www.galago-project.org/specs/notification/0.9/x344.html
+LEVELS = {
+    "info": ("Info", 0),
+    "warning": ("Warning", 1),
+    "critical": ("ERROR", 2),
+}
+
+
+class Notifications:
+    """Collects the messages of a run and shows them as a single desktop notification.
+
+    The notification is sent from a background thread, so a slow notification server never delays a
+    switch. Its id is kept on disk and passed as replaces_id the next time: a new notification updates
+    the previous one in place instead of stacking another popup. With rate_limit set (e.g. scheduled
+    runs), a notification identical to one sent less than rate_limit seconds ago is not shown again.
+    """
+
+    def __init__(
+            self,
+            state_file: str,
+            notify,
+            app_name: str,
+            icons: dict,
+            expire_timeout: int = -1,
+            rate_limit: float = 0,
+        ) -> None:
+        """
+        Args:
+            state_file (str): The JSON file where the id of the last notification and the times of the
+                recent ones are kept.
+            notify (callable): Calls the Notify method of "org.freedesktop.Notifications" with the given
+                arguments, returns the id of the notification.
+            app_name (str): The name of the application shown by the notification server.
+            icons (dict): Maps each level ("info", "warning", "critical") to its icon.
+            expire_timeout (int, optional): See the Notify method. Defaults to -1.
+            rate_limit (float, optional): Seconds before an identical notification is shown again, 0 to
+                always show it. Defaults to 0.
+        """
+        self.state_file = state_file
+        self.notify_server = notify
+        self.app_name = app_name
+        self.icons = icons
+        self.expire_timeout = expire_timeout
+        self.rate_limit = rate_limit
+        self._messages = []
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._threads = []
+
+    def add(
+            self,
+            level: str,
+            message: str,
+            summary: str = None,
+        ) -> None:
+        """Adds a message to the next notification, see flush().
+
+        Args:
+            level (str): "info", "warning" or "critical".
+            message (str): The message.
+            summary (str, optional): The title of the notification, if this is the most severe message.
+                Defaults to the title of the level.
+        """
+        with self._lock:
+            self._messages.append((level, message, summary or LEVELS[level][0]))
+
+    def flush(self) -> None:
+        """Sends the messages added so far as one notification, in the background."""
+        with self._lock:
+            messages, self._messages = self._messages, []
+        if not messages:
+            return
+        level, _, summary = max(messages, key=lambda message: LEVELS[message[0]][1])
+        body = "\n".join(dict.fromkeys(message for _, message, _ in messages))
+        thread = threading.Thread(target=self._send, args=(level, summary, body), name="notify", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def notify(
+            self,
+            level: str,
+            message: str,
+            summary: str = None,
+        ) -> None:
+        """Shows a message right away, together with the ones added so far (see add() and flush())."""
+        self.add(level, message, summary)
+        self.flush()
+
+    def wait(self, timeout: float = 2) -> None:
+        """Waits for the notifications in flight, e.g. before exiting.
+
+        Args:
+            timeout (float, optional): The maximum time to wait, in seconds. Defaults to 2.
+        """
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+
+    def _load_state(self) -> dict:
+        try:
+            with open(self.state_file, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self, state: dict) -> None:
+        from atomicfile import write_atomically
+
+        os.makedirs(os.path.dirname(self.state_file), exist_ok=True)
+        write_atomically(self.state_file, json.dumps(state))
+
+    def _send(
+            self,
+            level: str,
+            summary: str,
+            body: str,
+        ) -> None:
+        # One notification at a time: each one replaces the previous
+        with self._send_lock:
+            state = self._load_state()
+            now = time.time()
+            key = hashlib.sha256(f"{summary}\0{body}".encode()).hexdigest()[:16]
+            sent = {k: t for k, t in state.get("sent", {}).items() if now - t < max(self.rate_limit, 0)}
+            if key in sent:
+                logger.debug("[notify] Already notified %.0fs ago: %s", now - sent[key], body)
+                return
+            try:
+                state["replaces_id"] = int(self.notify_server(
+                    self.app_name,
+                    state.get("replaces_id", 0),
+                    self.icons[level],
+                    summary,
+                    body,
+                    [],
+                    {"urgency" : LEVELS[level][1]},
+                    self.expire_timeout,
+                ))
+            except Exception as e:
+                # Never let a notification break a switch
+                logger.warning("[notify] Unable to notify: %s", e)
+                return
+            if self.rate_limit > 0:
+                sent[key] = now
+            state["sent"] = sent
+            try:
+                self._save_state(state)
+            except OSError as e:
+                logger.warning("[notify] Unable to save %s: %s", self.state_file, e)
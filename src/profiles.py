@@ -0,0 +1,174 @@
+import os
+import json
+import logging
+import threading
+
+import tracing
+
+logger = logging.getLogger("LightHouse")
+
+
+def mtime(path: str) -> int:
+    """Returns the modification time of a file or directory in ns, None if it does not exist."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class ProfileCache:
+    """The named theme profiles of the configuration file, compiled and validated once.
+
+    Compiling a profile resolves its paths (e.g. "~/Pictures/night.png") and validates its themes.
+    The result is kept on disk together with the mtimes of the configuration file and of the resources
+    the validation looked at (the Global Theme directories, the wallpaper, the Konsole profile): as long
+    as none of them changes, a profile is served with a few stat calls and no validation at all.
+    The names of the last profiles applied are kept too, see toggle().
+    """
+
+    def __init__(
+            self,
+            cache_file: str,
+            settings_file: str,
+            validate,
+            resources,
+            keys: dict,
+            path_arguments: list = (),
+        ) -> None:
+        """
+        Args:
+            cache_file (str): The JSON file where the compiled profiles are persisted.
+            settings_file (str): The configuration file defining the profiles (the "profiles" section).
+            validate (callable): Takes the switch_theme() arguments of a profile, returns a dict mapping
+                each argument whose theme does not exist to the reason (empty if all of them exist).
+            resources (callable): Takes the switch_theme() arguments of a profile, returns the paths
+                whose changes may change the outcome of validate.
+            keys (dict): Maps the keys of a profile (e.g. "plasma") to the switch_theme() arguments
+                (e.g. "plasma_theme").
+            path_arguments (list, optional): The arguments holding file paths (e.g. "wallpaper"), relative
+                to the configuration file. Defaults to none.
+        """
+        self.cache_file = cache_file
+        self.settings_file = settings_file
+        self.validate = validate
+        self.resources = resources
+        self.keys = keys
+        self.path_arguments = path_arguments
+        self._lock = threading.Lock()
+        self._cache = None
+
+    def _load(self) -> dict:
+        if self._cache is None:
+            try:
+                with open(self.cache_file, "r") as f:
+                    self._cache = json.load(f)
+            except (OSError, ValueError):
+                self._cache = {}
+            self._cache.setdefault("history", [])
+        return self._cache
+
+    def _save(self) -> None:
+        from atomicfile import write_atomically
+
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            write_atomically(self.cache_file, json.dumps(self._cache))
+        except OSError as e:
+            logger.warning("[profiles] Unable to save %s: %s", self.cache_file, e)
+
+    def _read_profiles(self) -> dict:
+        try:
+            with open(self.settings_file, "r") as f:
+                profiles = json.load(f).get("profiles", {})
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, AttributeError) as e:
+            raise RuntimeError(f"Unable to read the configuration file {self.settings_file}: {e}")
+        if not isinstance(profiles, dict) or not all(isinstance(p, dict) for p in profiles.values()):
+            raise RuntimeError(f"Invalid \"profiles\" section in {self.settings_file}")
+        return profiles
+
+    def _compile(self, profile: dict) -> dict:
+        unknown = set(profile) - set(self.keys)
+        if unknown:
+            return {"themes": None, "error": f"Unknown profile keys: {', '.join(sorted(unknown))}", "invalid": {}, "resources": {}}
+
+        themes = {argument: profile.get(key) or "" for key, argument in self.keys.items()}
+        for argument in self.path_arguments:
+            if themes[argument]:
+                # Relative paths are relative to the configuration file, not to wherever the shortcut runs
+                themes[argument] = os.path.abspath(os.path.join(
+                    os.path.dirname(self.settings_file),
+                    os.path.expanduser(themes[argument]),
+                ))
+
+        # Take the mtimes before validating, so that a change during the validation is noticed next time
+        resources = {path: mtime(path) for path in self.resources(themes)}
+        return {"themes": themes, "error": None, "invalid": self.validate(themes), "resources": resources}
+
+    @tracing.traced
+    def get(self, name: str) -> tuple:
+        """Returns the compiled profile, compiling it again only if something it depends on changed.
+
+        Args:
+            name (str): The name of the profile.
+
+        Raises:
+            RuntimeError: If the configuration file cannot be read or the profile does not exist.
+
+        Returns:
+            tuple: (themes, invalid), themes being the switch_theme() arguments of the profile and invalid
+                mapping each argument whose theme does not exist to the reason. The invalid arguments are
+                left empty in themes, so that the rest of the profile can still be applied.
+        """
+        with self._lock:
+            cache = self._load()
+            config_mtime = mtime(self.settings_file)
+            if cache.get("config_mtime") != config_mtime:
+                logger.debug("[profiles] %s changed, compiling the profiles again", self.settings_file)
+                cache["definitions"] = self._read_profiles()
+                cache["config_mtime"] = config_mtime
+                cache["profiles"] = {}
+
+            if name not in cache["definitions"]:
+                raise RuntimeError(f"Cannot find a profile named \"{name}\" in {self.settings_file}")
+
+            compiled = cache["profiles"].get(name)
+            if compiled is None or any(mtime(path) != previous for path, previous in compiled["resources"].items()):
+                logger.debug("[profiles] Compiling profile: %s", name)
+                compiled = cache["profiles"][name] = self._compile(cache["definitions"][name])
+                self._save()
+            if compiled["themes"] is None:
+                raise RuntimeError(f"Invalid profile \"{name}\" in {self.settings_file}: {compiled['error']}")
+            invalid = compiled["invalid"]
+            themes = {argument: "" if argument in invalid else theme for argument, theme in compiled["themes"].items()}
+            return themes, dict(invalid)
+
+    def applied(self, name: str) -> None:
+        """Records that the profile has just been applied, see toggle().
+
+        Args:
+            name (str): The name of the profile.
+        """
+        with self._lock:
+            history = self._load()["history"]
+            if history and history[-1] == name:
+                return
+            history.append(name)
+            del history[:-2]
+            self._save()
+
+    def toggle(self) -> str:
+        """Returns the name of the profile applied before the current one.
+
+        Raises:
+            RuntimeError: If less than two different profiles have been applied so far.
+
+        Returns:
+            str: The name of the profile.
+        """
+        with self._lock:
+            history = self._load()["history"]
+            if len(history) < 2:
+                raise RuntimeError("Nothing to toggle, two different profiles must be applied first!")
+            return history[-2]
@@ -0,0 +1,151 @@
+import os
+import time
+import errno
+import ctypes
+import logging
+import datetime
+
+from solar import sun_times, sun_is_up
+
+logger = logging.getLogger("LightHouse")
+
+# See timerfd_create(2)
+CLOCK_REALTIME = 0
+TFD_TIMER_ABSTIME = 1 << 0
+TFD_TIMER_CANCEL_ON_SET = 1 << 1
+
+# Upper bound of a single sleep when timerfd is not available
+FALLBACK_SLEEP = 60
+
+
+class _timespec(ctypes.Structure):
+    _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+class _itimerspec(ctypes.Structure):
+    _fields_ = [("it_interval", _timespec), ("it_value", _timespec)]
+
+
+def day_events(
+        day: datetime.date,
+        latitude: float,
+        longitude: float,
+        sunrise_offset: float = 0,
+        sunset_offset: float = 0,
+    ) -> list:
+    """Returns the theme transitions of the given day.
+
+    Args:
+        day (datetime.date): The day.
+        latitude (float): The latitude of the location, in degrees.
+        longitude (float): The longitude of the location, in degrees.
+        sunrise_offset (float, optional): Minutes to add to sunrise. Defaults to 0.
+        sunset_offset (float, optional): Minutes to add to sunset. Defaults to 0.
+
+    Returns:
+        list: (datetime, phase) tuples, phase being "day" or "night". Empty during polar days and nights.
+    """
+    times = sun_times(day, latitude, longitude)
+    if times is None:
+        return []
+    sunrise, sunset = times
+    return [
+        (sunrise + datetime.timedelta(minutes=sunrise_offset), "day"),
+        (sunset + datetime.timedelta(minutes=sunset_offset), "night"),
+    ]
+
+def current_phase(
+        now: datetime.datetime,
+        latitude: float,
+        longitude: float,
+        sunrise_offset: float = 0,
+        sunset_offset: float = 0,
+    ) -> str:
+    """Returns the phase ("day" or "night") holding at the given time.
+
+    Args:
+        now (datetime.datetime): A timezone-aware datetime.
+        latitude (float): The latitude of the location, in degrees.
+        longitude (float): The longitude of the location, in degrees.
+        sunrise_offset (float, optional): Minutes to add to sunrise. Defaults to 0.
+        sunset_offset (float, optional): Minutes to add to sunset. Defaults to 0.
+
+    Returns:
+        str: "day" or "night".
+    """
+    today = now.astimezone(datetime.timezone.utc).date()
+    events = []
+    for delta in (-1, 0, 1):
+        events += day_events(today + datetime.timedelta(days=delta), latitude, longitude, sunrise_offset, sunset_offset)
+    past = [phase for when, phase in sorted(events) if when <= now]
+    if past:
+        return past[-1]
+    # Polar day or night
+    return "day" if sun_is_up(today, latitude) else "night"
+
+def next_transition(
+        now: datetime.datetime,
+        latitude: float,
+        longitude: float,
+        sunrise_offset: float = 0,
+        sunset_offset: float = 0,
+    ) -> tuple:
+    """Returns the first transition after the given time.
+
+    Args:
+        now (datetime.datetime): A timezone-aware datetime.
+        latitude (float): The latitude of the location, in degrees.
+        longitude (float): The longitude of the location, in degrees.
+        sunrise_offset (float, optional): Minutes to add to sunrise. Defaults to 0.
+        sunset_offset (float, optional): Minutes to add to sunset. Defaults to 0.
+
+    Returns:
+        tuple: (datetime, phase), or None if the sun neither rises nor sets within a year.
+    """
+    today = now.astimezone(datetime.timezone.utc).date()
+    # Polar days and nights can last months: look up to a year ahead
+    for delta in range(-1, 367):
+        for when, phase in day_events(today + datetime.timedelta(days=delta), latitude, longitude, sunrise_offset, sunset_offset):
+            if when > now:
+                return when, phase
+    return None
+
+def sleep_until(timestamp: float) -> bool:
+    """Sleeps until the given wall clock time, with a single wakeup.
+
+    A CLOCK_REALTIME timerfd is used: unlike time.sleep(), it keeps counting during suspend (it fires
+    right after resume if the time has passed) and it is cancelled if the system clock is changed.
+
+    Args:
+        timestamp (float): The UNIX time to wake up at.
+
+    Returns:
+        bool: True if the time has been reached, False if the sleep was cut short because the system
+            clock changed: the caller should compute the next wakeup again.
+    """
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.timerfd_create(CLOCK_REALTIME, os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        fd = -1
+    if fd < 0:
+        # No timerfd, sleep in bounded steps so that suspend and clock changes are caught up quickly
+        while time.time() < timestamp:
+            time.sleep(min(max(timestamp - time.time(), 0), FALLBACK_SLEEP))
+        return True
+
+    try:
+        spec = _itimerspec()
+        spec.it_value.tv_sec = int(timestamp)
+        spec.it_value.tv_nsec = int((timestamp - int(timestamp)) * 1e9)
+        if libc.timerfd_settime(fd, TFD_TIMER_ABSTIME | TFD_TIMER_CANCEL_ON_SET, ctypes.byref(spec), None) < 0:
+            raise OSError(ctypes.get_errno(), "timerfd_settime failed")
+        try:
+            os.read(fd, 8)
+        except OSError as e:
+            if e.errno == errno.ECANCELED:
+                logger.debug("[scheduler] System clock changed")
+                return False
+            raise
+        return True
+    finally:
+        os.close(fd)
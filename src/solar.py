@@ -0,0 +1,89 @@
+import math
+import datetime
+
+# Solar zenith angle at sunrise and sunset: 90° plus atmospheric refraction and the sun's radius
+SUNRISE_ZENITH = 90.833
+
+
+def _fractional_year(day: datetime.date) -> float:
+    """Returns the fractional year (radians) at noon UTC of the given day."""
+    days_in_year = 366 if day.year % 4 == 0 and (day.year % 100 != 0 or day.year % 400 == 0) else 365
+    return 2 * math.pi / days_in_year * (day.timetuple().tm_yday - 1)
+
+def solar_declination(day: datetime.date) -> float:
+    """Returns the declination of the sun (radians) on the given day.
+
+    See NOAA's "General Solar Position Calculations".
+
+    Args:
+        day (datetime.date): The day.
+
+    Returns:
+        float: The solar declination, in radians.
+    """
+    g = _fractional_year(day)
+    return (0.006918 - 0.399912 * math.cos(g) + 0.070257 * math.sin(g) - 0.006758 * math.cos(2 * g)
+            + 0.000907 * math.sin(2 * g) - 0.002697 * math.cos(3 * g) + 0.00148 * math.sin(3 * g))
+
+def equation_of_time(day: datetime.date) -> float:
+    """Returns the equation of time (minutes) on the given day.
+
+    Args:
+        day (datetime.date): The day.
+
+    Returns:
+        float: The difference between apparent and mean solar time, in minutes.
+    """
+    g = _fractional_year(day)
+    return 229.18 * (0.000075 + 0.001868 * math.cos(g) - 0.032077 * math.sin(g)
+                     - 0.014615 * math.cos(2 * g) - 0.040849 * math.sin(2 * g))
+
+def sun_times(
+        day: datetime.date,
+        latitude: float,
+        longitude: float,
+    ) -> tuple:
+    """Computes sunrise and sunset for the given day and location, offline.
+
+    Accuracy is within a couple of minutes, more than enough to switch themes.
+
+    Args:
+        day (datetime.date): The day.
+        latitude (float): The latitude of the location, in degrees (north positive).
+        longitude (float): The longitude of the location, in degrees (east positive).
+
+    Returns:
+        tuple: (sunrise, sunset) as timezone-aware UTC datetimes, or None if the sun does not rise or
+            set that day (polar day or night, see sun_is_up()).
+    """
+    phi = math.radians(latitude)
+    decl = solar_declination(day)
+    cos_hour_angle = (math.cos(math.radians(SUNRISE_ZENITH)) / (math.cos(phi) * math.cos(decl))
+                      - math.tan(phi) * math.tan(decl))
+    if not -1.0 <= cos_hour_angle <= 1.0:
+        return None
+
+    hour_angle = math.degrees(math.acos(cos_hour_angle))
+    midnight = datetime.datetime(day.year, day.month, day.day, tzinfo=datetime.timezone.utc)
+    eqtime = equation_of_time(day)
+    sunrise = midnight + datetime.timedelta(minutes=720 - 4 * (longitude + hour_angle) - eqtime)
+    sunset = midnight + datetime.timedelta(minutes=720 - 4 * (longitude - hour_angle) - eqtime)
+    return sunrise, sunset
+
+def sun_is_up(
+        day: datetime.date,
+        latitude: float,
+    ) -> bool:
+    """Tells whether the sun is above the horizon at solar noon of the given day.
+
+    Used for polar days and nights, when sun_times() returns None.
+
+    Args:
+        day (datetime.date): The day.
+        latitude (float): The latitude of the location, in degrees (north positive).
+
+    Returns:
+        bool: True if the sun is up at noon.
+    """
+    noon_zenith = abs(latitude - math.degrees(solar_declination(day)))
+    return noon_zenith < SUNRISE_ZENITH
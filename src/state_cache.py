@@ -0,0 +1,129 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger("LightHouse")
+
+
+def fingerprint(path: str, previous: list = None) -> list:
+    """Returns the fingerprint of a file: [mtime_ns, size, sha256].
+
+    Hashing is skipped when mtime and size match the previous fingerprint, so checking an unchanged
+    file costs a single stat.
+
+    Args:
+        path (str): The path of the file.
+        previous (list, optional): A previous fingerprint of the same file. Defaults to None.
+
+    Returns:
+        list: The fingerprint, None if the file does not exist.
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    if previous is not None and previous[:2] == [st.st_mtime_ns, st.st_size]:
+        return previous
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return [st.st_mtime_ns, st.st_size, digest.hexdigest()]
+
+
+class StateCache:
+    """Remembers, for each component, the value last applied and the fingerprints of the files it touched.
+
+    A component whose value did not change and whose files are still the same as right after it was
+    applied does not need to be applied again: checking this costs a few stat calls, no D-Bus and no
+    subprocess. A file rewritten by someone else (e.g. System Settings) makes the component stale.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Args:
+            path (str): The JSON file where the state is persisted.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._state = None
+
+    def _load(self) -> dict:
+        if self._state is None:
+            try:
+                with open(self.path, "r") as f:
+                    self._state = json.load(f)
+            except (OSError, ValueError):
+                self._state = {}
+        return self._state
+
+    def is_current(
+            self,
+            component: str,
+            value,
+            files: list,
+        ) -> bool:
+        """Checks whether the given value is still applied for the component.
+
+        Args:
+            component (str): The name of the component, e.g. "plasma".
+            value: The value to be applied (JSON serializable).
+            files (list): The paths of the files the component touches.
+
+        Returns:
+            bool: True if the value was the last one applied and none of the files changed since.
+        """
+        with self._lock:
+            entry = self._load().get(component)
+        if entry is None or entry["value"] != value or sorted(entry["files"]) != sorted(files):
+            return False
+        for path, previous in entry["files"].items():
+            if previous is None or fingerprint(path, previous) != previous:
+                logger.debug("[state] %s changed since %s was applied", path, component)
+                return False
+        return True
+
+    def record(
+            self,
+            component: str,
+            value,
+            files: list,
+        ) -> None:
+        """Records that the value has just been applied for the component.
+
+        Args:
+            component (str): The name of the component, e.g. "plasma".
+            value: The value applied (JSON serializable).
+            files (list): The paths of the files the component touches.
+        """
+        entry = {"value": value, "files": {path: fingerprint(path) for path in files}}
+        with self._lock:
+            self._load()[component] = entry
+
+    def forget(self, component: str) -> None:
+        """Drops what is known about the component, so that it is applied again next time.
+
+        Args:
+            component (str): The name of the component, e.g. "plasma".
+        """
+        with self._lock:
+            self._load().pop(component, None)
+
+    def save(self) -> None:
+        """Writes the state to disk, atomically.
+
+        Failing to do so is not an error of the switch: the components are simply applied again next time.
+        """
+        from atomicfile import write_atomically
+
+        with self._lock:
+            if self._state is None:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                write_atomically(self.path, json.dumps(self._state))
+            except OSError as e:
+                logger.warning("[state] Unable to save %s: %s", self.path, e)
@@ -0,0 +1,144 @@
+import os
+import json
+import logging
+import threading
+import configparser
+
+logger = logging.getLogger("LightHouse")
+
+
+def read_package_metadata(package_path: str) -> dict:
+    """Reads the metadata of a look-and-feel package.
+
+    Both metadata.json (Plasma 5.2x+) and the older metadata.desktop are supported.
+
+    Args:
+        package_path (str): The directory of the package.
+
+    Returns:
+        dict: {"id", "name", "path", "defaults"}, None if the directory is not a look-and-feel package.
+            "defaults" is the path of the file listing the settings applied by the package (color
+            scheme, icons, Plasma style...), None if the package has none.
+    """
+    defaults = os.path.join(package_path, "contents", "defaults")
+    if not os.path.isfile(defaults):
+        defaults = None
+
+    try:
+        with open(os.path.join(package_path, "metadata.json"), "r") as f:
+            plugin = json.load(f).get("KPlugin", {})
+        return {
+            "id": plugin.get("Id") or os.path.basename(package_path),
+            "name": plugin.get("Name") or plugin.get("Id") or os.path.basename(package_path),
+            "path": package_path,
+            "defaults": defaults,
+        }
+    except (OSError, ValueError):
+        pass
+
+    desktop = configparser.ConfigParser(interpolation=None, strict=False)
+    try:
+        if not desktop.read(os.path.join(package_path, "metadata.desktop")):
+            return None
+    except configparser.Error:
+        return None
+    entry = desktop["Desktop Entry"] if desktop.has_section("Desktop Entry") else {}
+    return {
+        "id": entry.get("X-KDE-PluginInfo-Name") or os.path.basename(package_path),
+        "name": entry.get("Name") or os.path.basename(package_path),
+        "path": package_path,
+        "defaults": defaults,
+    }
+
+
+class ThemeIndex:
+    """Index of the installed look-and-feel packages (Global Themes), persisted between runs.
+
+    The index is rebuilt only when the modification time of one of the package directories changes,
+    i.e. when a package is installed or removed: looking up a theme is then a dictionary lookup,
+    instead of running 'lookandfeeltool -l'.
+    """
+
+    def __init__(
+            self,
+            cache_file: str,
+            package_dirs: list,
+        ) -> None:
+        """
+        Args:
+            cache_file (str): The JSON file where the index is persisted.
+            package_dirs (list): The directories holding the packages, by increasing priority (a package
+                found in a later directory overrides the one with the same id found in an earlier one).
+        """
+        self.cache_file = cache_file
+        self.package_dirs = package_dirs
+        self._lock = threading.Lock()
+        self._mtimes = None
+        self._packages = None
+
+    def _dir_mtimes(self) -> dict:
+        mtimes = {}
+        for directory in self.package_dirs:
+            try:
+                mtimes[directory] = os.stat(directory).st_mtime_ns
+            except OSError:
+                mtimes[directory] = None
+        return mtimes
+
+    def _scan(self) -> dict:
+        packages = {}
+        for directory in self.package_dirs:
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.is_dir():
+                    metadata = read_package_metadata(entry.path)
+                    if metadata is not None:
+                        packages[metadata["id"]] = metadata
+        return packages
+
+    @property
+    def packages(self) -> dict:
+        """The installed packages: maps each package id to its metadata (see read_package_metadata())."""
+        with self._lock:
+            # A few stat calls, so that a long running process (e.g. the daemon) sees new packages too
+            mtimes = self._dir_mtimes()
+            if mtimes == self._mtimes:
+                return self._packages
+
+            self._mtimes = mtimes
+            try:
+                with open(self.cache_file, "r") as f:
+                    cached = json.load(f)
+                if cached["dirs"] == mtimes:
+                    self._packages = cached["packages"]
+                    return self._packages
+            except (OSError, ValueError, KeyError):
+                pass
+
+            from atomicfile import write_atomically
+
+            logger.debug("[index] Scanning look-and-feel packages in: %s", self.package_dirs)
+            self._packages = self._scan()
+            try:
+                os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+                write_atomically(self.cache_file, json.dumps({"dirs": mtimes, "packages": self._packages}))
+            except OSError as e:
+                logger.debug("[index] Unable to persist the index: %s", e)
+            return self._packages
+
+    def get(self, package_id: str) -> dict:
+        """Returns the metadata of the given package.
+
+        Args:
+            package_id (str): The id of the package, as listed by 'lookandfeeltool -l'.
+
+        Returns:
+            dict: The metadata, None if the package is not installed.
+        """
+        return self.packages.get(package_id)
+
+    def __contains__(self, package_id: str) -> bool:
+        return package_id in self.packages
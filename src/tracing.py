@@ -0,0 +1,135 @@
+import os
+import time
+import functools
+import threading
+
+# Spans are recorded only once enable() has been called (--timings): until then span() returns a
+# shared no-op context manager and traced functions cost a single flag check.
+enabled = False
+
+_lock = threading.Lock()
+# (name, start_ns, end_ns, thread id, args)
+_spans = []
+_origin_ns = time.perf_counter_ns()
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    def __init__(self, name: str, args: dict) -> None:
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.args["error"] = repr(exc_value)
+        record(self.name, self.start, time.perf_counter_ns(), **self.args)
+        return False
+
+
+def enable() -> None:
+    """Starts recording spans."""
+    global enabled
+    enabled = True
+
+def span(name: str, **args):
+    """Returns a context manager timing the enclosed block.
+
+    Example:
+        with tracing.span("lookandfeeltool --apply", theme=plasma_theme):
+            subprocess.run(...)
+
+    Args:
+        name (str): The name of the span, spans with the same name are aggregated in the summary.
+        **args: Details shown in the trace viewer.
+
+    Returns:
+        A context manager, a shared no-op one when tracing is disabled.
+    """
+    if not enabled:
+        return _NULL_SPAN
+    return _Span(name, args)
+
+def traced(function):
+    """Decorator recording a span, named after the function, around every call."""
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not enabled:
+            return function(*args, **kwargs)
+        with _Span(function.__name__, {}):
+            return function(*args, **kwargs)
+    return wrapper
+
+def record(
+        name: str,
+        start_ns: int,
+        end_ns: int,
+        **args,
+    ) -> None:
+    """Records a span whose start and end have been measured elsewhere (e.g. asynchronous D-Bus calls).
+
+    Args:
+        name (str): The name of the span.
+        start_ns (int): time.perf_counter_ns() at the start.
+        end_ns (int): time.perf_counter_ns() at the end.
+        **args: Details shown in the trace viewer.
+    """
+    if not enabled:
+        return
+    with _lock:
+        _spans.append((name, start_ns, end_ns, threading.get_ident(), args))
+
+def summary() -> str:
+    """Returns a table of the spans recorded, aggregated by name, slowest first.
+
+    Returns:
+        str: The table, one line per span name: calls, total, mean and max time in ms.
+    """
+    totals = {}
+    with _lock:
+        for name, start, end, _, _ in _spans:
+            calls, total, longest = totals.get(name, (0, 0, 0))
+            totals[name] = (calls + 1, total + end - start, max(longest, end - start))
+
+    lines = ["--- LightHouse timings ---", f"\t{'span':<48}{'calls':>7}{'total ms':>12}{'mean ms':>12}{'max ms':>12}"]
+    for name, (calls, total, longest) in sorted(totals.items(), key=lambda item: -item[1][1]):
+        lines.append(f"\t{name:<48}{calls:>7}{total / 1e6:>12.2f}{total / calls / 1e6:>12.2f}{longest / 1e6:>12.2f}")
+    lines.append("--- LightHouse timings ---")
+    return "\n".join(lines)
+
+def write_chrome_trace(path: str) -> None:
+    """Writes the spans recorded as a Chrome trace, to be opened in chrome://tracing or ui.perfetto.dev.
+
+    Args:
+        path (str): The path of the JSON file.
+    """
+    import json
+
+    pid = os.getpid()
+    with _lock:
+        events = [
+            {
+                "name": name,
+                "ph": "X",
+                "ts": (start - _origin_ns) / 1000,
+                "dur": (end - start) / 1000,
+                "pid": pid,
+                "tid": tid,
+                "args": {key: str(value) for key, value in args.items()},
+            }
+            for name, start, end, tid, args in _spans
+        ]
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
@@ -0,0 +1,198 @@
+import io
+import os
+import glob
+import hashlib
+import logging
+
+import tracing
+
+logger = logging.getLogger("LightHouse")
+
+
+def screen_resolutions() -> list:
+    """Returns the native resolution of every connected screen, read from the kernel (no D-Bus, no X11).
+
+    Returns:
+        list: The distinct (width, height) tuples, in pixels.
+    """
+    resolutions = set()
+    for connector in glob.glob("/sys/class/drm/card*-*"):
+        try:
+            with open(os.path.join(connector, "status"), "r") as f:
+                if f.read().strip() != "connected":
+                    continue
+            with open(os.path.join(connector, "modes"), "r") as f:
+                # The preferred mode comes first
+                mode = f.readline().strip()
+        except OSError:
+            continue
+        width, _, height = mode.partition("x")
+        if width.isdigit() and height.rstrip("i").isdigit():
+            resolutions.add((int(width), int(height.rstrip("i"))))
+    return sorted(resolutions)
+
+def render(
+        source: str,
+        width: int,
+        height: int,
+        destination: str,
+    ) -> str:
+    """Scales and crops an image to the given resolution, like Plasma's "Scaled and Cropped" fill mode.
+
+    Runs in a worker process, see WallpaperCache.prerender().
+
+    Args:
+        source (str): The path of the original image.
+        width (int): The width of the screen.
+        height (int): The height of the screen.
+        destination (str): The path of the rendered image (written atomically).
+
+    Raises:
+        OSError: If the image cannot be read or written.
+
+    Returns:
+        str: destination.
+    """
+    # Optional dependency, only needed to fill the cache
+    from PIL import Image, ImageOps
+    from atomicfile import write_atomically
+
+    with Image.open(source) as image:
+        # Decode at a fraction of the size when the format allows it (JPEG): 8K photos shrink a lot
+        image.draft("RGB", (width, height))
+        image = ImageOps.exif_transpose(image)
+        image = ImageOps.fit(image.convert("RGB"), (width, height), method=Image.Resampling.LANCZOS)
+
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=92, optimize=True)
+    write_atomically(destination, output.getvalue(), 0o644)
+    return destination
+
+
+class WallpaperCache:
+    """Wallpapers pre-rendered at the resolution of each screen, so that plasmashell does not decode and
+    scale the full-size originals at every switch.
+
+    A rendered variant is named after the path, mtime and size of its source and the target resolution:
+    editing the source or connecting another screen simply leads to new names. The cache is bounded in
+    size, the least recently used variants (by mtime, refreshed at every lookup) are dropped first.
+    """
+
+    def __init__(
+            self,
+            cache_dir: str,
+            max_bytes: int,
+        ) -> None:
+        """
+        Args:
+            cache_dir (str): The directory of the rendered variants.
+            max_bytes (int): The maximum total size of the variants.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def variant_path(
+            self,
+            source: str,
+            width: int,
+            height: int,
+        ) -> str:
+        """Returns the path of the variant of the source for the given resolution.
+
+        Args:
+            source (str): The path of the original image.
+            width (int): The width of the screen.
+            height (int): The height of the screen.
+
+        Raises:
+            OSError: If the source does not exist.
+
+        Returns:
+            str: The path, whether the variant has been rendered or not.
+        """
+        source = os.path.realpath(source)
+        st = os.stat(source)
+        key = hashlib.sha256(f"{source}\0{st.st_mtime_ns}\0{st.st_size}".encode()).hexdigest()[:32]
+        return os.path.join(self.cache_dir, f"{key}-{width}x{height}.jpg")
+
+    @tracing.traced
+    def lookup(
+            self,
+            source: str,
+            resolutions: list,
+        ) -> list:
+        """Returns the variants of the source already rendered, marking them as recently used.
+
+        Args:
+            source (str): The path of the original image.
+            resolutions (list): The (width, height) of the screens.
+
+        Returns:
+            list: The (width, height, path) of the rendered variants, smallest first.
+        """
+        variants = []
+        for width, height in sorted(resolutions, key=lambda resolution: resolution[0] * resolution[1]):
+            try:
+                path = self.variant_path(source, width, height)
+                os.utime(path)
+            except OSError:
+                continue
+            variants.append((width, height, path))
+        return variants
+
+    def prerender(
+            self,
+            sources: list,
+            resolutions: list,
+            max_workers: int = None,
+        ) -> int:
+        """Renders the missing variants of the given sources in a pool of processes, then trims the cache.
+
+        Args:
+            sources (list): The paths of the original images.
+            resolutions (list): The (width, height) of the screens.
+            max_workers (int, optional): The number of processes. Defaults to the number of CPUs.
+
+        Returns:
+            int: The number of variants rendered.
+        """
+        from concurrent import futures
+
+        missing = {}
+        for source in set(sources):
+            for width, height in resolutions:
+                try:
+                    path = self.variant_path(source, width, height)
+                except OSError as e:
+                    logger.warning("[wallpaper] Cannot pre-render %s: %s", source, e)
+                    break
+                if not os.path.exists(path):
+                    missing[path] = (source, width, height)
+
+        rendered = 0
+        if missing:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+                jobs = {executor.submit(render, *job, path): job for path, job in missing.items()}
+                for job in futures.as_completed(jobs):
+                    try:
+                        logger.debug("[wallpaper] Rendered %s", job.result())
+                        rendered += 1
+                    except Exception as e:
+                        logger.warning("[wallpaper] Cannot pre-render %s: %s", jobs[job][0], e)
+        self.trim()
+        return rendered
+
+    def trim(self) -> None:
+        """Drops the least recently used variants until the cache fits in max_bytes."""
+        try:
+            entries = [entry for entry in os.scandir(self.cache_dir) if entry.name.endswith(".jpg")]
+        except FileNotFoundError:
+            return
+        entries = sorted(((entry.stat().st_mtime_ns, entry.stat().st_size, entry.path) for entry in entries), reverse=True)
+        total = 0
+        for _, size, path in entries:
+            total += size
+            if total > self.max_bytes:
+                logger.debug("[wallpaper] Dropping %s", path)
+                os.unlink(path)
@@ -0,0 +1,89 @@
+import os
+import ctypes
+import struct
+import select
+import logging
+
+logger = logging.getLogger("LightHouse")
+
+# See inotify(7)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_CLOEXEC = os.O_CLOEXEC
+
+# struct inotify_event: int wd; uint32_t mask, cookie, len; char name[len]
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class FileWatcher:
+    """Waits for some files to be rewritten, with inotify: no polling, the process sleeps until then.
+
+    The parent directories are watched rather than the files, as most tools (LightHouse included) save
+    a file by renaming a new one over it, which a watch on the file itself would not follow.
+    """
+
+    def __init__(self, paths: list) -> None:
+        """
+        Args:
+            paths (list): The paths of the files to be watched.
+
+        Raises:
+            OSError: If inotify is not available or a directory cannot be watched.
+        """
+        # Symlinks (e.g. dotfile managers) are followed: the destination is the file being rewritten
+        self.paths = {os.path.realpath(path): path for path in paths}
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        self._directories = {}
+        for directory in {os.path.dirname(path) for path in self.paths}:
+            wd = self._libc.inotify_add_watch(self.fd, directory.encode(), IN_CLOSE_WRITE | IN_MOVED_TO)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                self.close()
+                raise OSError(errno, f"Cannot watch {directory}")
+            self._directories[wd] = directory
+
+    def _read_events(self) -> set:
+        changed = set()
+        data = os.read(self.fd, 64 * 1024)
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0").decode(errors="replace")
+            offset += EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost, consider every file changed
+                return set(self.paths.values())
+            path = os.path.join(self._directories.get(wd, ""), name)
+            if path in self.paths:
+                changed.add(self.paths[path])
+        return changed
+
+    def wait(self, debounce: float = 0.5) -> set:
+        """Blocks until some of the files are rewritten, then until they are left alone for a while.
+
+        Saving a file often comes as a burst of events (e.g. System Settings rewriting kdeglobals several
+        times): they are reported together, once nothing happened for debounce seconds.
+
+        Args:
+            debounce (float, optional): The quiet time, in seconds. Defaults to 0.5.
+
+        Returns:
+            set: The paths (as given to the constructor) of the files rewritten.
+        """
+        changed = set()
+        while not changed:
+            changed |= self._read_events()
+        while select.select([self.fd], [], [], debounce)[0]:
+            changed |= self._read_events()
+        return changed
+
+    def close(self) -> None:
+        """Stops watching."""
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1